@@ -1,5 +1,7 @@
 #!/usr/bin/python
 
+from intcode import load_program
+
 """
 --- Day 2: 1202 Program Alarm ---
 
@@ -91,6 +93,109 @@ def run(p):
 			p[p[i+3]] = p[p[i+1]] * p[p[i+2]]
 		i += 4			
 
+"""
+Symbolic mode: memory cells hold polynomials in the noun and verb, stored as
+{ (noun power, verb power) : coefficient }.  A read through an address that
+depends on the inputs gives None (unknown), which is fine as long as the value
+is overwritten before it matters.  If an unknown or symbolic value is needed as
+an opcode or address, or ends up in position 0, run_symbolic returns None.
+"""
+
+def const(c):
+	return { (0,0) : c }
+
+def poly_add(a, b):
+	r = dict(a)
+	for k, c in b.items():
+		r[k] = r.get(k, 0) + c
+	return { k : c for k, c in r.items() if c != 0 }
+
+def poly_mul(a, b):
+	r = dict()
+	for (i1, j1), c1 in a.items():
+		for (i2, j2), c2 in b.items():
+			k = (i1+i2, j1+j2)
+			r[k] = r.get(k, 0) + c1 * c2
+	return { k : c for k, c in r.items() if c != 0 }
+
+def concrete(a):
+	# Integer value of a polynomial with no noun or verb terms, else None
+	if a is None or any(k != (0,0) for k in a):
+		return None
+	return a.get((0,0), 0)
+
+def run_symbolic(program):
+	p = [ const(x) for x in program ]
+	p[1] = { (1,0) : 1 }
+	p[2] = { (0,1) : 1 }
+	i = 0
+	while True:
+		op = concrete(p[i])
+		if op == 99:
+			return p[0]
+		elif op == 1 or op == 2:
+			a, b, dst = [ concrete(p[i+k]) for k in (1,2,3) ]
+			if dst is None:
+				return None
+			x = None if a is None else p[a]
+			y = None if b is None else p[b]
+			if x is None or y is None:
+				p[dst] = None
+			else:
+				p[dst] = poly_add(x, y) if op == 1 else poly_mul(x, y)
+		else:
+			return None
+		i += 4
+
+def evaluate(expr, noun, verb):
+	return sum(c * noun ** i * verb ** j for (i, j), c in expr.items())
+
+def solve_affine(expr, target):
+	# expr is c0 + c1*noun + c2*verb; returns (noun, verb) or None
+	c0 = expr.get((0,0), 0)
+	c1 = expr.get((1,0), 0)
+	c2 = expr.get((0,1), 0)
+	for noun in range(100):
+		rest = target - c0 - c1 * noun
+		if c2 == 0:
+			if rest == 0:
+				return noun, 0
+		elif rest % c2 == 0 and 0 <= rest // c2 <= 99:
+			return noun, rest // c2
+	return None
+
+def try_noun(args):
+	# One worker's share of the brute-force search
+	program, target, noun = args
+	for verb in range(100):
+		p = program[:]
+		p[1] = noun
+		p[2] = verb
+		if run(p)[0] == target:
+			return noun, verb
+	return None
+
+def search(program, target):
+	from multiprocessing import Pool
+	with Pool() as pool:
+		for found in pool.imap_unordered(try_noun, [ (program, target, noun) for noun in range(100) ]):
+			if found is not None:
+				pool.terminate()
+				return found
+	return None
+
+def solve(program, target):
+	expr = run_symbolic(program)
+	if expr is None:
+		return search(program, target)
+	if all(i + j <= 1 for i, j in expr):
+		return solve_affine(expr, target)
+	for noun in range(100):
+		for verb in range(100):
+			if evaluate(expr, noun, verb) == target:
+				return noun, verb
+	return None
+
 
 if __name__ == "__main__":
 	
@@ -103,32 +208,14 @@ if __name__ == "__main__":
 	"""
 
 	# Part 1 Solution
-	with open("day02_input", 'r') as infile:
-		program = infile.readline().strip()
-		program = program.split(',')
-		program = [ int(x) for x in program ]
-		program[1] = 12
-		program[2] = 2
-		program = run(program)
-		print(program[0])
+	program = load_program("day02_input")
+	program[1] = 12
+	program[2] = 2
+	program = run(program)
+	print(program[0])
 
 	# Part 2 Solution
-	result = 0
 	target = 19690720
-	noun = 100
-	verb = 99
-	while result != target and verb > 0:
-		noun = noun - 1
-		if noun == 0:
-			verb = verb - 1
-			noun = 99
-		with open("day02_input", 'r') as infile:
-			program = infile.readline().strip()
-			program = program.split(',')
-			program = [ int(x) for x in program ]
-			program[1] = noun
-			program[2] = verb
-			program = run(program)
-			result = program[0]
+	program = load_program("day02_input")
+	noun, verb = solve(program, target)
 	print(100 * noun + verb)
-
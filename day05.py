@@ -1,5 +1,7 @@
 #!/usr/bin/python
 
+from intcode import load_program
+
 """
 --- Day 5: Sunny with a Chance of Asteroids ---
 
@@ -268,23 +270,17 @@ if __name__ == "__main__":
 	"""
 
 	# Part 1 Solution
-	with open("day05_input", 'r') as infile:
-		program = infile.readline().strip()
-		program = program.split(',')
-		program = [ int(x) for x in program ]
-		prog_in = 1		
-		run(program)
-		print(prog_out)
+	program = load_program("day05_input")
+	prog_in = 1		
+	run(program)
+	print(prog_out)
 
 	prog_in = None
 	prog_out = None
 
 	# Part 2 Solution
-	with open("day05_input", 'r') as infile:
-		program = infile.readline().strip()
-		program = program.split(',')
-		program = [ int(x) for x in program ]
-		prog_in = 5		
-		run(program)
-		print(prog_out)
+	program = load_program("day05_input")
+	prog_in = 5		
+	run(program)
+	print(prog_out)
 
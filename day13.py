@@ -1,5 +1,8 @@
 #!/usr/bin/python
 
+from intcode import IntPuterVM, load_program
+from intcode.framing import Framer
+
 """
 --- Day 13: Care Package ---
 
@@ -35,286 +38,36 @@ Beat the game by breaking all the blocks. What is your score after the last bloc
 
 """
 
-class IntPuterVM:
-	
-	def __init__(self, memory):
-		self.mem = memory
-		self.mem += [0] * 5000
-		self.last_out = None
-		self.prog_in = []
-		self.halted = False
-		self.blocked = True
-		self.ip_state = 0
-		self.base = 0
-
-	def buffer_read(self, i):
-		self.prog_in.append(i)
-		self.blocked = False
-
-	def run(self):
-		ip = self.ip_state
-		while True:
-			A = None
-			B = None
-			C = None
-			d_ip = None
-			ip_updated = False
-			op = self.mem[ip]
-			modes, opcode = str(op)[:-2], int(str(op)[-2:])
-			if opcode == 99: # Halt
-				self.halted = True
-				return
-			if opcode == 1: # res = C + B
-				d_ip = 4
-				if modes == '':
-					self.mem[self.mem[ip+3]] = self.mem[self.mem[ip+1]] + self.mem[self.mem[ip+2]]
-				else:
-					if modes[-1] == '1':
-						C = self.mem[ip+1]
-					elif modes[-1] == '2':
-						C = self.mem[self.base+self.mem[ip+1]]
-					elif modes[-1] == '0':
-						C = self.mem[self.mem[ip+1]]
-					modes = modes[:-1]
-					if modes == '':
-						modes = '0'
-					if modes[-1] == '1':
-						B = self.mem[ip+2]
-					elif modes[-1] == '2':
-						B = self.mem[self.base+self.mem[ip+2]]
-					elif modes[-1] == '0':
-						B = self.mem[self.mem[ip+2]]
-					modes = modes[:-1]
-					if modes == '' or modes[-1] == '0':
-						self.mem[self.mem[ip+3]] = C + B
-					elif modes == '2':
-						self.mem[self.base+self.mem[ip+3]] = C + B
-			elif opcode == 2: # res = C * B
-				d_ip = 4
-				if modes == '':
-					self.mem[self.mem[ip+3]] = self.mem[self.mem[ip+1]] * self.mem[self.mem[ip+2]]
-				else:
-					if modes[-1] == '1':
-						C = self.mem[ip+1]
-					elif modes[-1] == '2':
-						C = self.mem[self.base+self.mem[ip+1]]
-					elif modes[-1] == '0':
-						C = self.mem[self.mem[ip+1]]
-					modes = modes[:-1]
-					if modes == '':
-						modes = '0'
-					if modes[-1] == '1':
-						B = self.mem[ip+2]
-					elif modes[-1] == '2':
-						B = self.mem[self.base+self.mem[ip+2]]
-					elif modes[-1] == '0':
-						B = self.mem[self.mem[ip+2]]
-					modes = modes[:-1]
-					if modes == '' or modes[-1] == '0':
-						self.mem[self.mem[ip+3]] = C * B
-					elif modes[-1] == '2':
-						self.mem[self.base+self.mem[ip+3]] = C * B
-			elif opcode == 3: # Store input at param 1
-				d_ip = 2
-				if len(self.prog_in) == 0:
-					self.blocked = True
-					self.ip_state = ip
-					return
-				if modes == '' or modes == '0':
-					self.mem[self.mem[ip+1]] = self.prog_in.pop(0)
-				elif modes == '1':
-					self.mem[ip+1] = self.prog_in.pop(0)
-				elif modes == '2':
-					self.mem[self.base+self.mem[ip+1]] = self.prog_in.pop(0)
-			elif opcode == 4: # Output value at param 1
-				d_ip = 2
-				if modes == '' or modes == '0':
-					self.last_out = self.mem[self.mem[ip+1]]
-				elif modes == '1':
-					self.last_out = self.mem[ip+1]
-				elif modes == '2':
-					self.last_out = self.mem[self.base+self.mem[ip+1]]
-				yield self.last_out
-			elif opcode == 5: # Jump if True (non-zero)
-				d_ip = 3
-				if modes == '':
-					if self.mem[self.mem[ip+1]] != 0:
-						ip = self.mem[self.mem[ip+2]]
-						ip_updated = True
-				else:
-					if modes[-1] == '1':
-						C = self.mem[ip+1]
-					elif modes[-1] == '0':
-						C = self.mem[self.mem[ip+1]]
-					elif modes[-1] == '2':
-						C = self.mem[self.base+self.mem[ip+1]]
-					modes = modes[:-1]
-					if modes == '':
-						modes = '0'
-					if modes[-1] == '1':
-						B = self.mem[ip+2]
-					elif modes[-1] == '0':
-						B = self.mem[self.mem[ip+2]]
-					elif modes[-1] == '2':
-						B = self.mem[self.base+self.mem[ip+2]]
-					modes = modes[:-1]
-					if C != 0:
-						ip = B
-						ip_updated = True
-			elif opcode == 6: # Jump if False (zero)
-				d_ip = 3
-				if modes == '':
-					if self.mem[self.mem[ip+1]] == 0:
-						ip = self.mem[self.mem[ip+2]]
-						ip_updated = True
-				else:
-					if modes[-1] == '1':
-						C = self.mem[ip+1]
-					elif modes[-1] == '0':
-						C = self.mem[self.mem[ip+1]]
-					elif modes[-1] == '2':
-						C = self.mem[self.base+self.mem[ip+1]]
-					modes = modes[:-1]
-					if modes == '':
-						modes = '0'
-					if modes[-1] == '1':
-						B = self.mem[ip+2]
-					elif modes[-1] == '0':
-						B = self.mem[self.mem[ip+2]]
-					elif modes[-1] == '2':
-						B = self.mem[self.base+self.mem[ip+2]]
-					modes = modes[:-1]
-					if C == 0:
-						ip = B
-						ip_updated = True
-			elif opcode == 7: # res = C < B
-				d_ip = 4
-				if modes == '':
-					if self.mem[self.mem[ip+1]] < self.mem[self.mem[ip+2]]:
-						self.mem[self.mem[ip+3]] = 1
-					else:
-						self.mem[self.mem[ip+3]] = 0
-				else:
-					if modes[-1] == '1':
-						C = self.mem[ip+1]
-					elif modes[-1] == '0':
-						C = self.mem[self.mem[ip+1]]
-					elif modes[-1] == '2':
-						C = self.mem[self.base+self.mem[ip+1]]
-					modes = modes[:-1]
-					if modes == '':
-						modes = '0'
-					if modes[-1] == '1':
-						B = self.mem[ip+2]
-					elif modes[-1] == '0':
-						B = self.mem[self.mem[ip+2]]
-					elif modes[-1] == '2':
-						B = self.mem[self.base+self.mem[ip+2]]
-					modes = modes[:-1]
-					if C < B:
-						if modes == '' or modes[-1] == '0':
-							self.mem[self.mem[ip+3]] = 1
-						elif modes[-1] == '2':
-							self.mem[self.base+self.mem[ip+3]] = 1
-					else:
-						if modes == '' or modes[-1] == '0':
-							self.mem[self.mem[ip+3]] = 0
-						elif modes[-1] == '2':
-							self.mem[self.base+self.mem[ip+3]] = 0
-			elif opcode == 8: # res = C == B
-				d_ip = 4
-				if modes == '':
-					if self.mem[self.mem[ip+1]] == self.mem[self.mem[ip+2]]:
-						self.mem[self.mem[ip+3]] = 1
-					else:
-						self.mem[self.mem[ip+3]] = 0
-				else:
-					if modes[-1] == '1':
-						C = self.mem[ip+1]
-					elif modes[-1] == '0':
-						C = self.mem[self.mem[ip+1]]
-					elif modes[-1] == '2':
-						C = self.mem[self.base+self.mem[ip+1]]
-					modes = modes[:-1]
-					if modes == '':
-						modes = '0'
-					if modes[-1] == '1':
-						B = self.mem[ip+2]
-					elif modes[-1] == '0':
-						B = self.mem[self.mem[ip+2]]
-					elif modes[-1] == '2':
-						B = self.mem[self.base+self.mem[ip+2]]
-					modes = modes[:-1]
-					if C == B:
-						if modes == '' or modes[-1] == '0':
-							self.mem[self.mem[ip+3]] = 1
-						elif modes[-1] == '2':
-							self.mem[self.base+self.mem[ip+3]] = 1
-					else:
-						if modes == '' or modes[-1] == '0':
-							self.mem[self.mem[ip+3]] = 0
-						elif modes[-1] == '2':
-							self.mem[self.base+self.mem[ip+3]] = 0
-			elif opcode == 9: # adjust base pointer by param
-				d_ip = 2
-				if modes == '':
-					self.base += self.mem[self.mem[ip+1]]
-				else:
-					if modes[-1] == '1':
-						self.base += self.mem[ip+1]
-					elif modes[-1] == '0':
-						self.base += self.mem[self.mem[ip+1]]
-					elif modes[-1] == '2':
-						self.base += self.mem[self.base+self.mem[ip+1]]
-			if not ip_updated:
-				ip += d_ip
-
 def run_arcade1(vm):
-	outs = []
+	pixels = Framer(3, vm)
 	screen = dict()
 	while not vm.halted:
-		for o in vm.run():
-			outs.append(o)
-		while len(outs) >= 3:
-			pixel = outs[0:3]
-			outs = outs[3:]
-			x = pixel[0]
-			y = pixel[1]
-			p = pixel[2]
+		for x, y, p in pixels.run_until():
 			screen[(x,y)] = p
 	return screen
 
 def play_game(vm, screen):
 	game_won = False
+	pixels = Framer(3, vm)
 	while not game_won:
 		if list(screen.values()).count(2) == 0 and (-1,0) in screen:
 			game_won = True
 			print(screen[(-1,0)])
 			return
-		outs = []
-		for o in vm.run():
-			outs.append(o)
-		while len(outs) >= 3:
-			pixel = outs[0:3]
-			outs = outs[3:]
-			x = pixel[0]
-			y = pixel[1]
-			p = pixel[2]
+		for x, y, p in pixels.run_until():
 			screen[(x,y)] = p
 		vm.buffer_read(0)
 
 if __name__ == "__main__":
 
 	# Part 1 Solution
-	with open("day13_input", 'r') as infile:
-		prog = [ int(x) for x in infile.readline().strip().split(',') ]
+	prog = load_program("day13_input")
 	vm = IntPuterVM(prog[:])
 	screen = run_arcade1(vm)
 	print(list(screen.values()).count(2))
 
 	# Part 2 Solution
-	with open("day13_input", 'r') as infile:
-		prog = [ int(x) for x in infile.readline().strip().split(',') ]
+	prog = load_program("day13_input")
 	vm = IntPuterVM(prog[:])
 	vm.mem[0] = 2
 	play_game(vm, screen)
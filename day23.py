@@ -1,6 +1,9 @@
 #!/usr/bin/python
 
-
+import asyncio
+from intcode import IntPuterVM, load_program
+from intcode.aio import Idle
+from intcode.framing import Framer
 
 """
 --- Day 23: Category Six ---
@@ -37,319 +40,66 @@ Although it hasn't changed, you can still get your puzzle input.
 
 """
 
-class IntPuterVM:
-	
-	def __init__(self, memory):
-		self.mem = memory
-		self.mem += [0] * 5000
-		self.last_out = None
-		self.prog_in = []
-		self.halted = False
-		self.blocked = True
-		self.ip_state = 0
-		self.base = 0
-
-	def buffer_read(self, i):
-		self.prog_in.append(i)
-		self.blocked = False
-
-	def ascii_read(self, cmd):
-		for char in cmd:
-			self.buffer_read(ord(char))
-		self.buffer_read(10)
-
-	def run(self):
-		ip = self.ip_state
-		while True:
-			A = None
-			B = None
-			C = None
-			d_ip = None
-			ip_updated = False
-			op = self.mem[ip]
-			modes, opcode = str(op)[:-2], int(str(op)[-2:])
-			if opcode == 99: # Halt
-				self.halted = True
-				return
-			if opcode == 1: # res = C + B
-				d_ip = 4
-				if modes == '':
-					self.mem[self.mem[ip+3]] = self.mem[self.mem[ip+1]] + self.mem[self.mem[ip+2]]
-				else:
-					if modes[-1] == '1':
-						C = self.mem[ip+1]
-					elif modes[-1] == '2':
-						C = self.mem[self.base+self.mem[ip+1]]
-					elif modes[-1] == '0':
-						C = self.mem[self.mem[ip+1]]
-					modes = modes[:-1]
-					if modes == '':
-						modes = '0'
-					if modes[-1] == '1':
-						B = self.mem[ip+2]
-					elif modes[-1] == '2':
-						B = self.mem[self.base+self.mem[ip+2]]
-					elif modes[-1] == '0':
-						B = self.mem[self.mem[ip+2]]
-					modes = modes[:-1]
-					if modes == '' or modes[-1] == '0':
-						self.mem[self.mem[ip+3]] = C + B
-					elif modes == '2':
-						self.mem[self.base+self.mem[ip+3]] = C + B
-			elif opcode == 2: # res = C * B
-				d_ip = 4
-				if modes == '':
-					self.mem[self.mem[ip+3]] = self.mem[self.mem[ip+1]] * self.mem[self.mem[ip+2]]
-				else:
-					if modes[-1] == '1':
-						C = self.mem[ip+1]
-					elif modes[-1] == '2':
-						C = self.mem[self.base+self.mem[ip+1]]
-					elif modes[-1] == '0':
-						C = self.mem[self.mem[ip+1]]
-					modes = modes[:-1]
-					if modes == '':
-						modes = '0'
-					if modes[-1] == '1':
-						B = self.mem[ip+2]
-					elif modes[-1] == '2':
-						B = self.mem[self.base+self.mem[ip+2]]
-					elif modes[-1] == '0':
-						B = self.mem[self.mem[ip+2]]
-					modes = modes[:-1]
-					if modes == '' or modes[-1] == '0':
-						self.mem[self.mem[ip+3]] = C * B
-					elif modes[-1] == '2':
-						self.mem[self.base+self.mem[ip+3]] = C * B
-			elif opcode == 3: # Store input at param 1
-				d_ip = 2
-				if len(self.prog_in) == 0:
-					#self.blocked = True
-					#self.ip_state = ip
-					#return
-					self.prog_in.append(-1)
-				if modes == '' or modes == '0':
-					self.mem[self.mem[ip+1]] = self.prog_in.pop(0)
-				elif modes == '1':
-					self.mem[ip+1] = self.prog_in.pop(0)
-				elif modes == '2':
-					self.mem[self.base+self.mem[ip+1]] = self.prog_in.pop(0)
-			elif opcode == 4: # Output value at param 1
-				d_ip = 2
-				if modes == '' or modes == '0':
-					self.last_out = self.mem[self.mem[ip+1]]
-				elif modes == '1':
-					self.last_out = self.mem[ip+1]
-				elif modes == '2':
-					self.last_out = self.mem[self.base+self.mem[ip+1]]
-				yield self.last_out
-			elif opcode == 5: # Jump if True (non-zero)
-				d_ip = 3
-				if modes == '':
-					if self.mem[self.mem[ip+1]] != 0:
-						ip = self.mem[self.mem[ip+2]]
-						ip_updated = True
-				else:
-					if modes[-1] == '1':
-						C = self.mem[ip+1]
-					elif modes[-1] == '0':
-						C = self.mem[self.mem[ip+1]]
-					elif modes[-1] == '2':
-						C = self.mem[self.base+self.mem[ip+1]]
-					modes = modes[:-1]
-					if modes == '':
-						modes = '0'
-					if modes[-1] == '1':
-						B = self.mem[ip+2]
-					elif modes[-1] == '0':
-						B = self.mem[self.mem[ip+2]]
-					elif modes[-1] == '2':
-						B = self.mem[self.base+self.mem[ip+2]]
-					modes = modes[:-1]
-					if C != 0:
-						ip = B
-						ip_updated = True
-			elif opcode == 6: # Jump if False (zero)
-				d_ip = 3
-				if modes == '':
-					if self.mem[self.mem[ip+1]] == 0:
-						ip = self.mem[self.mem[ip+2]]
-						ip_updated = True
-				else:
-					if modes[-1] == '1':
-						C = self.mem[ip+1]
-					elif modes[-1] == '0':
-						C = self.mem[self.mem[ip+1]]
-					elif modes[-1] == '2':
-						C = self.mem[self.base+self.mem[ip+1]]
-					modes = modes[:-1]
-					if modes == '':
-						modes = '0'
-					if modes[-1] == '1':
-						B = self.mem[ip+2]
-					elif modes[-1] == '0':
-						B = self.mem[self.mem[ip+2]]
-					elif modes[-1] == '2':
-						B = self.mem[self.base+self.mem[ip+2]]
-					modes = modes[:-1]
-					if C == 0:
-						ip = B
-						ip_updated = True
-			elif opcode == 7: # res = C < B
-				d_ip = 4
-				if modes == '':
-					if self.mem[self.mem[ip+1]] < self.mem[self.mem[ip+2]]:
-						self.mem[self.mem[ip+3]] = 1
-					else:
-						self.mem[self.mem[ip+3]] = 0
-				else:
-					if modes[-1] == '1':
-						C = self.mem[ip+1]
-					elif modes[-1] == '0':
-						C = self.mem[self.mem[ip+1]]
-					elif modes[-1] == '2':
-						C = self.mem[self.base+self.mem[ip+1]]
-					modes = modes[:-1]
-					if modes == '':
-						modes = '0'
-					if modes[-1] == '1':
-						B = self.mem[ip+2]
-					elif modes[-1] == '0':
-						B = self.mem[self.mem[ip+2]]
-					elif modes[-1] == '2':
-						B = self.mem[self.base+self.mem[ip+2]]
-					modes = modes[:-1]
-					if C < B:
-						if modes == '' or modes[-1] == '0':
-							self.mem[self.mem[ip+3]] = 1
-						elif modes[-1] == '2':
-							self.mem[self.base+self.mem[ip+3]] = 1
-					else:
-						if modes == '' or modes[-1] == '0':
-							self.mem[self.mem[ip+3]] = 0
-						elif modes[-1] == '2':
-							self.mem[self.base+self.mem[ip+3]] = 0
-			elif opcode == 8: # res = C == B
-				d_ip = 4
-				if modes == '':
-					if self.mem[self.mem[ip+1]] == self.mem[self.mem[ip+2]]:
-						self.mem[self.mem[ip+3]] = 1
-					else:
-						self.mem[self.mem[ip+3]] = 0
-				else:
-					if modes[-1] == '1':
-						C = self.mem[ip+1]
-					elif modes[-1] == '0':
-						C = self.mem[self.mem[ip+1]]
-					elif modes[-1] == '2':
-						C = self.mem[self.base+self.mem[ip+1]]
-					modes = modes[:-1]
-					if modes == '':
-						modes = '0'
-					if modes[-1] == '1':
-						B = self.mem[ip+2]
-					elif modes[-1] == '0':
-						B = self.mem[self.mem[ip+2]]
-					elif modes[-1] == '2':
-						B = self.mem[self.base+self.mem[ip+2]]
-					modes = modes[:-1]
-					if C == B:
-						if modes == '' or modes[-1] == '0':
-							self.mem[self.mem[ip+3]] = 1
-						elif modes[-1] == '2':
-							self.mem[self.base+self.mem[ip+3]] = 1
-					else:
-						if modes == '' or modes[-1] == '0':
-							self.mem[self.mem[ip+3]] = 0
-						elif modes[-1] == '2':
-							self.mem[self.base+self.mem[ip+3]] = 0
-			elif opcode == 9: # adjust base pointer by param
-				d_ip = 2
-				if modes == '':
-					self.base += self.mem[self.mem[ip+1]]
-				else:
-					if modes[-1] == '1':
-						self.base += self.mem[ip+1]
-					elif modes[-1] == '0':
-						self.base += self.mem[self.mem[ip+1]]
-					elif modes[-1] == '2':
-						self.base += self.mem[self.base+self.mem[ip+1]]
-			if not ip_updated:
-				ip += d_ip
-			self.ip_state = ip
-			return
+class Router:
+
+	# Outbox of one node: collects (dest, x, y) triples and delivers them
+	def __init__(self, inboxes, nat):
+		self.inboxes = inboxes
+		self.nat = nat
+		self.packets = Framer(3)
+
+	async def put(self, value):
+		for dest, x, y in self.packets.push((value,)):
+			if dest == 255:
+				self.nat.put_nowait((x, y))
+			elif dest < len(self.inboxes):
+				self.inboxes[dest].put_nowait(x)
+				self.inboxes[dest].put_nowait(y)
+
+def boot(prog, num_vms, idle=False):
+	inboxes = [ asyncio.Queue() for i in range(num_vms) ]
+	nat = asyncio.Queue()
+	tracker = Idle(inboxes) if idle else None
+	tasks = []
+	for i in range(num_vms):
+		inboxes[i].put_nowait(i)
+		vm = IntPuterVM(prog, paged=True)
+		# -1 tells a node no packet is waiting
+		tasks.append(asyncio.create_task(vm.arun(inboxes[i], Router(inboxes, nat), -1, tracker)))
+	return inboxes, nat, tracker, tasks
+
+async def first_nat_packet(prog, num_vms):
+	inboxes, nat, tracker, tasks = boot(prog, num_vms)
+	x, y = await nat.get()
+	for task in tasks:
+		task.cancel()
+	return y
+
+async def nat_repeat(prog, num_vms):
+	# Each time the network goes quiet, the NAT resends its last packet to node 0
+	inboxes, nat, tracker, tasks = boot(prog, num_vms, idle=True)
+	seen_y = set()
+	last = None
+	while True:
+		await tracker.wait()
+		while not nat.empty():
+			last = nat.get_nowait()
+		if last is None:
+			continue
+		if last[1] in seen_y:
+			for task in tasks:
+				task.cancel()
+			return last[1]
+		seen_y.add(last[1])
+		inboxes[0].put_nowait(last[0])
+		inboxes[0].put_nowait(last[1])
 
 if __name__ == "__main__":
 
 	# Part 1 Solution
-	with open("day23_input", 'r') as infile:
-		prog = [ int(x) for x in infile.readline().strip().split(',') ]
-	num_vms = 50
-	vms = []
-	netbuf = dict()
-	for i in range(num_vms):
-		vms.append(IntPuterVM(prog[:]))
-		netbuf[i] = list()
-	for i in range(num_vms):
-		vms[i].buffer_read(i)
-	solving = True
-	while solving:
-		for i in range(num_vms):
-			for out in vms[i].run():
-				netbuf[i].append(out)
-			if len(netbuf[i]) == 3:
-				dest = netbuf[i][0]
-				x    = netbuf[i][1]
-				y    = netbuf[i][2]
-				netbuf[i] = list()
-				if dest == 255:
-					print(y)
-					solving = False
-					break
-				if dest <= num_vms:
-					vms[dest].buffer_read(x)
-					vms[dest].buffer_read(y)
+	prog = load_program("day23_input")
+	print(asyncio.run(first_nat_packet(prog, 50)))
 
 	# Part 2 Solution
-	with open("day23_input", 'r') as infile:
-		prog = [ int(x) for x in infile.readline().strip().split(',') ]
-	num_vms = 50
-	vms = []
-	netbuf = dict()
-	seen_y = set()
-	for i in range(num_vms):
-		vms.append(IntPuterVM(prog[:]))
-		netbuf[i] = list()
-	netbuf[255] = list()
-	for i in range(num_vms):
-		vms[i].buffer_read(i)
-	solving = True
-	while solving:
-		for i in range(num_vms):
-			for out in vms[i].run():
-				netbuf[i].append(out)
-			if len(netbuf[i]) == 3:
-				dest = netbuf[i][0]
-				x    = netbuf[i][1]
-				y    = netbuf[i][2]
-				netbuf[i] = list()
-				if dest == 255:
-					netbuf[255] = [x, y]
-				if dest <= num_vms:
-					vms[dest].buffer_read(x)
-					vms[dest].buffer_read(y)
-		pending_data = False
-		for z in range(num_vms):
-			if len(vms[z].prog_in) > 0:
-				pending_data = True
-				break				
-		if pending_data == False and len(netbuf[255]) == 2:
-				vms[0].buffer_read(netbuf[255][0])
-				vms[0].buffer_read(netbuf[255][1])
-				if netbuf[255][1] in seen_y:
-					print(netbuf[255][1])
-					solving = False
-					break
-				else:
-					seen_y.add(netbuf[255][1])
-					netbuf[255] = list()			
+	prog = load_program("day23_input")
+	print(asyncio.run(nat_repeat(prog, 50)))
@@ -0,0 +1,3 @@
+from intcode.vm import IntPuterVM, decode, LENGTHS
+from intcode.memory import PagedMemory
+from intcode.loader import load_program
@@ -0,0 +1,71 @@
+"""
+asyncio front end for IntPuterVM.
+
+	inbox, outbox = asyncio.Queue(), asyncio.Queue()
+	task = asyncio.create_task(vm.arun(inbox, outbox))
+
+The VM executes with run_until() until it needs input, puts whatever it wrote
+on the outbox, then awaits the inbox.  Anything already queued on the inbox is
+taken without suspending, so a busy VM runs in long slices and a starved one
+costs nothing until a value arrives.  Networks (day07's amplifier loop,
+day23's 50 nodes) become one task per VM joined by queues; the event loop
+wakes exactly the VMs that have input.
+
+The outbox can be anything with an async put(), e.g. a router that collects
+packets before delivering them.
+
+Some programs treat an empty input as a value of its own (day23 reads -1).
+With poll given, a VM that finds its inbox empty is first fed poll once; only
+if that produces no output does it wait.  An Idle tracker shared by the VMs
+of a network records which of them are waiting and lets another task sleep
+until every VM is waiting with nothing queued.
+"""
+
+import asyncio
+
+class Idle:
+
+	def __init__(self, inboxes):
+		self.inboxes = inboxes
+		self.waiting = 0
+		self.event = asyncio.Event()
+
+	def enter(self):
+		self.waiting += 1
+		if self.waiting == len(self.inboxes) and all(q.empty() for q in self.inboxes):
+			self.event.set()
+
+	def leave(self):
+		self.waiting -= 1
+
+	async def wait(self):
+		# Until the whole network is waiting on empty inboxes
+		await self.event.wait()
+		self.event.clear()
+
+async def run(vm, inbox, outbox, poll=None, idle=None):
+	polled = False
+	while True:
+		outs = vm.run_until()
+		for out in outs:
+			await outbox.put(out)
+		if vm.halted:
+			return vm.last_out
+		if outs:
+			polled = False
+		while not inbox.empty():
+			vm.buffer_read(inbox.get_nowait())
+		if vm.prog_in:
+			continue
+		if poll is not None and not polled:
+			vm.buffer_read(poll)
+			polled = True
+			await asyncio.sleep(0) # let the rest of the network run
+			continue
+		if idle is not None:
+			idle.enter()
+		value = await inbox.get()
+		if idle is not None:
+			idle.leave()
+		vm.buffer_read(value)
+		polled = False
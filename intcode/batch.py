@@ -0,0 +1,232 @@
+"""
+Lockstep execution of many copies of one Intcode program.
+
+	batch = BatchVM(prog, [ (x, y) for x in range(50) for y in range(50) ])
+	outputs = batch.run() # one list of outputs per instance
+
+Memory is held as a 2-D table with one column per address and one row per
+instance, so cols[addr][k] is instance k's copy of that cell.  Columns are
+only created when something writes to them; unwritten addresses read from a
+shared zero column.
+
+Instances standing at the same address form a group.  The instruction there
+is decoded once for the whole group and each operand is fetched for every
+member in a single pass down a column, so a step of 1000 instances costs a
+few list comprehensions rather than 1000 trips round the interpreter loop.
+When a jump sends members different ways the group is split, and groups that
+arrive at the same address are merged again.  The group at the lowest address
+always runs first, which lets groups that ran ahead on a short path wait at
+the join for the ones that took the long way round.
+
+Every instance starts with the same code, so a group shares its instruction
+and parameters.  Cells written since loading may differ between instances:
+a group reaching a written opcode cell is split by the opcode each member
+holds, and a written parameter cell (the programs patch their own immediates)
+is read per member rather than breaking up the group.
+
+An instance that needs input it has not been given stops and is left out of
+the next steps; feed() gives it more input and run() carries on from there.
+
+(NumPy is not a dependency here, so columns are plain lists of Python ints,
+which also keeps day09-sized numbers exact.)
+"""
+
+from collections import deque
+from operator import add, mul
+
+from intcode.vm import decode
+
+class BatchVM:
+
+	def __init__(self, memory, inputs):
+		self.n = len(inputs)
+		self.cols = { addr : [value] * self.n for addr, value in enumerate(memory) }
+		self.zero = [0] * self.n # column for every address not yet written
+		self.prog_in = [ deque(values) for values in inputs ]
+		self.outputs = [ [] for i in range(self.n) ]
+		self.ips = [0] * self.n
+		self.bases = [0] * self.n
+		self.halted = [False] * self.n
+		self.blocked = [False] * self.n
+		self.decoded = dict() # instruction value -> (opcode, mode1, mode2, mode3)
+		self.written = set() # cells that may no longer match the image
+		self.steps = 0 # group steps, one decode and dispatch each
+
+	def feed(self, k, values):
+		self.prog_in[k].extend(values)
+		if self.prog_in[k]:
+			self.blocked[k] = False
+
+	def column(self, addr):
+		# Writable column for addr
+		if addr not in self.cols:
+			self.cols[addr] = [0] * self.n
+		return self.cols[addr]
+
+	def common_base(self, members):
+		# The members' relative base if they all have the same one, else None
+		bases = self.bases
+		base = bases[members[0]]
+		if len({ bases[k] for k in members }) == 1:
+			return base
+		return None
+
+	def param(self, members, addr):
+		# The group's value of a parameter cell, or a list of one per member if
+		# they differ
+		col = self.cols.get(addr, self.zero)
+		if addr not in self.written:
+			return col[members[0]]
+		values = [ col[k] for k in members ]
+		if values.count(values[0]) == len(values):
+			return values[0]
+		return values
+
+	def select(self, members, p, chosen):
+		# A parameter as param() gave it for members, narrowed to chosen ones
+		if type(p) is not list:
+			return p
+		value = dict(zip(members, p))
+		return [ value[k] for k in chosen ]
+
+	def read(self, members, p, mode):
+		# Operand values for each member
+		cols = self.cols
+		zero = self.zero
+		bases = self.bases
+		if type(p) is list:
+			if mode == 1:
+				return p
+			elif mode == 0:
+				return [ cols.get(a, zero)[k] for k, a in zip(members, p) ]
+			return [ cols.get(bases[k]+a, zero)[k] for k, a in zip(members, p) ]
+		if mode == 1:
+			return [p] * len(members)
+		elif mode == 0:
+			col = cols.get(p, zero)
+			return [ col[k] for k in members ]
+		return [ cols.get(bases[k]+p, zero)[k] for k in members ]
+
+	def write(self, members, p, mode, values):
+		if mode == 0 and type(p) is not list:
+			col = self.column(p)
+			for k, v in zip(members, values):
+				col[k] = v
+			self.written.add(p)
+			return
+		if type(p) is not list:
+			p = [p] * len(members)
+		bases = self.bases
+		for k, a, v in zip(members, p, values):
+			if mode == 2:
+				a += bases[k]
+			self.column(a)[k] = v
+			self.written.add(a)
+
+	def split(self, members, ip):
+		# Partition members by the opcode they hold at ip
+		col = self.cols.get(ip, self.zero)
+		parts = dict()
+		for k in members:
+			parts.setdefault(col[k], []).append(k)
+		return list(parts.values())
+
+	def groups(self):
+		groups = dict()
+		for k in range(self.n):
+			if not self.halted[k] and not self.blocked[k]:
+				groups.setdefault(self.ips[k], []).append(k)
+		return groups
+
+	def run(self):
+		cols = self.cols
+		zero = self.zero
+		decoded = self.decoded
+		groups = self.groups()
+		while groups:
+			ip = min(groups)
+			members = groups.pop(ip)
+			if ip in self.written:
+				parts = self.split(members, ip)
+			else:
+				parts = [members]
+			moved = dict() # new ip -> members that got there
+			for members in parts:
+				k0 = members[0]
+				op = cols.get(ip, zero)[k0]
+				if op not in decoded:
+					decoded[op] = decode(op)
+				opcode, m1, m2, m3 = decoded[op]
+				p1, p2, p3 = [ self.param(members, a) for a in range(ip+1, ip+4) ]
+				self.steps += 1
+				if m1 == 2 or m2 == 2 or m3 == 2:
+					# Members usually share a frame; then relative operands are
+					# plain column accesses
+					base = self.common_base(members)
+					if base is not None:
+						if m1 == 2 and type(p1) is not list:
+							m1, p1 = 0, p1 + base
+						if m2 == 2 and type(p2) is not list:
+							m2, p2 = 0, p2 + base
+						if m3 == 2 and type(p3) is not list:
+							m3, p3 = 0, p3 + base
+				if opcode == 1 or opcode == 2 or opcode == 7 or opcode == 8:
+					C = self.read(members, p1, m1)
+					B = self.read(members, p2, m2)
+					if opcode == 1:
+						R = list(map(add, C, B))
+					elif opcode == 2:
+						R = list(map(mul, C, B))
+					elif opcode == 7:
+						R = [ 1 if c < b else 0 for c, b in zip(C, B) ]
+					else:
+						R = [ 1 if c == b else 0 for c, b in zip(C, B) ]
+					if m3 == 1: # write over the parameter cell itself
+						self.write(members, ip+3, 0, R)
+					else:
+						self.write(members, p3, m3, R)
+					moved.setdefault(ip+4, []).extend(members)
+				elif opcode == 5 or opcode == 6: # Jump if True (non-zero) / False (zero)
+					C = self.read(members, p1, m1)
+					want = opcode == 5
+					taken = [ k for k, c in zip(members, C) if (c != 0) == want ]
+					if len(taken) < len(members):
+						stay = [ k for k, c in zip(members, C) if (c != 0) != want ]
+						moved.setdefault(ip+3, []).extend(stay)
+					if taken and m2 == 1 and type(p2) is not list:
+						moved.setdefault(p2, []).extend(taken)
+					elif taken:
+						for k, nxt in zip(taken, self.read(taken, self.select(members, p2, taken), m2)):
+							moved.setdefault(nxt, []).append(k)
+				elif opcode == 9: # adjust base pointer by param
+					bases = self.bases
+					for k, c in zip(members, self.read(members, p1, m1)):
+						bases[k] += c
+					moved.setdefault(ip+2, []).extend(members)
+				elif opcode == 3: # Store input at param 1
+					ready = []
+					for k in members:
+						if len(self.prog_in[k]) == 0:
+							self.blocked[k] = True
+							self.ips[k] = ip
+						else:
+							ready.append(k)
+					values = [ self.prog_in[k].popleft() for k in ready ]
+					if m1 == 1:
+						self.write(ready, ip+1, 0, values)
+					else:
+						self.write(ready, self.select(members, p1, ready), m1, values)
+					if ready:
+						moved.setdefault(ip+2, []).extend(ready)
+				elif opcode == 4: # Output value at param 1
+					outputs = self.outputs
+					for k, c in zip(members, self.read(members, p1, m1)):
+						outputs[k].append(c)
+					moved.setdefault(ip+2, []).extend(members)
+				else: # Halt
+					for k in members:
+						self.halted[k] = True
+						self.ips[k] = ip
+			for nxt, members in moved.items():
+				groups.setdefault(nxt, []).extend(members)
+		return self.outputs
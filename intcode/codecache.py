@@ -0,0 +1,124 @@
+"""
+On-disk cache of translated code for the closure and compiled backends.
+
+	cache = lookup('compiled', VERSION, vm)
+	entry = cache.get(ip)
+	cache.put(ip, (end, cells, code))
+
+Translation compiles Python source with compile(), which is most of what a
+short run of the closure or compiled backend spends.  The code objects it
+makes are kept in a file per translator, and per program when given a VM:
+
+	$INTCODE_CACHE/<backend>-<version>.bin
+	$INTCODE_CACHE/<backend>-<version>-<sha1 of the image>.bin
+
+($INTCODE_CACHE defaults to ~/.cache/intcode; set it to an empty string to
+turn the cache off.)  The closure backend's handlers do not depend on the
+program, so it uses the first form.  The image of a VM is its memory when it
+is first translated, so a patched program (day02's noun and verb, day13's
+free play) gets its own file.  The hash is kept on the VM and inherited by
+its forks, so pooled and forked VMs of one image hash it once; a fork's file
+is named after the image its line started from, which is harmless as every
+entry is checked against the cells it covers.
+
+The file is headed by the interpreter's bytecode magic number, since
+marshalled code objects only load on the Python that wrote them; any mismatch
+or unreadable file is treated as an empty cache.
+
+Entries are whatever the backend stores under its keys, as long as marshal
+can write them (ints, tuples and code objects).  Changed caches are written
+back when the process exits, or by save_all(); like the loader's binary
+cache this is only a convenience, so failing to write is not an error.
+"""
+
+import atexit
+import importlib.util
+import marshal
+import os
+
+from intcode.prefix import program_hash
+
+MAGIC = b'ICCC' + importlib.util.MAGIC_NUMBER
+
+# path -> CodeCache, one per program and translator in this process
+caches = dict()
+
+def directory():
+	path = os.environ.get('INTCODE_CACHE')
+	if path is None:
+		path = os.path.join(os.path.expanduser('~'), '.cache', 'intcode')
+	return path
+
+def factory(code):
+	# The make function defined by a translated code object
+	scope = dict()
+	exec(code, scope)
+	return scope['make']
+
+class CodeCache:
+
+	def __init__(self, path):
+		self.path = path
+		self.entries = self.load()
+		self.changed = False
+
+	def load(self):
+		if not self.path:
+			return dict()
+		try:
+			with open(self.path, 'rb') as infile:
+				data = infile.read()
+			if not data.startswith(MAGIC):
+				return dict()
+			entries = marshal.loads(data[len(MAGIC):])
+		except (OSError, ValueError, EOFError, TypeError):
+			return dict()
+		return entries if type(entries) is dict else dict()
+
+	def get(self, key):
+		return self.entries.get(key)
+
+	def put(self, key, entry):
+		self.entries[key] = entry
+		self.changed = True
+
+	def save(self):
+		if not self.path or not self.changed:
+			return
+		tmp = '%s.%d.tmp' % (self.path, os.getpid())
+		try:
+			os.makedirs(os.path.dirname(self.path), exist_ok=True)
+			with open(tmp, 'wb') as outfile:
+				outfile.write(MAGIC)
+				outfile.write(marshal.dumps(self.entries))
+			os.replace(tmp, self.path)
+			self.changed = False
+		except (OSError, ValueError):
+			pass
+
+def digest(vm):
+	# Hash of vm's image, computed on first use
+	if vm.digest is None:
+		mem = vm.mem
+		image = mem if type(mem) is list else [ mem[addr] for addr in range(len(mem)) ]
+		vm.digest = program_hash(image)
+	return vm.digest
+
+def lookup(backend, version, vm=None):
+	# Cache for this backend, for vm's program if one is given
+	folder = directory()
+	path = ''
+	if folder:
+		name = '%s-%d' % (backend, version)
+		if vm is not None:
+			name += '-' + digest(vm)
+		path = os.path.join(folder, name + '.bin')
+	if path not in caches:
+		caches[path] = CodeCache(path)
+	return caches[path]
+
+def save_all():
+	for cache in caches.values():
+		cache.save()
+
+atexit.register(save_all)
@@ -0,0 +1,243 @@
+"""
+Basic-block compiler backend for IntPuterVM.
+
+Starting from any address the VM reaches, straight-line compute instructions
+are collected into a basic block that ends at a jump (5/6), before I/O (3/4),
+or before a halt.  The block is turned into Python source, compiled with
+compile() and run as one function call that returns the next ip.
+
+A write into a compiled block throws that block away.  The written cells are
+then marked dirty, and instructions touching dirty cells are run by the
+step interpreter below from then on, so self-modifying code stays correct.
+
+Compiled blocks only depend on the cells they cover, so they are shared by
+every VM running the same code at the same address.  They are also kept on
+disk per program image (intcode/codecache.py), with the block's extent, so
+a later process finding the same cells at ip skips both the scan and the
+compile.  VERSION is part of that cache's key; change it whenever the
+generated source changes.
+"""
+
+from intcode.vm import decode, generate, LENGTHS
+from intcode import codecache
+
+VERSION = 1
+
+EXPRS = {
+	1 : '%s + %s',
+	2 : '%s * %s',
+	7 : '1 if %s < %s else 0',
+	8 : '1 if %s == %s else 0',
+}
+
+# (start ip, covered cells) -> (code object, factory for the block function)
+block_cache = dict()
+
+def operand(mode, p):
+	if mode == 0:
+		return 'mem[%d]' % p
+	elif mode == 1:
+		return '%d' % p
+	return 'mem[base+%d]' % p
+
+def target(mode, p, a):
+	if mode == 2:
+		return 'base+%d' % p
+	elif mode == 1: # immediate write target means the cell itself
+		return '%d' % a
+	return '%d' % p
+
+def scan(mem, ip, dirty):
+	# Instructions (address, opcode, modes) making up the block at ip
+	instrs = []
+	size = len(mem)
+	while ip < size:
+		try:
+			opcode, m1, m2, m3 = decode(mem[ip])
+		except ValueError:
+			break
+		if opcode in (3, 4, 99):
+			break
+		length = LENGTHS[opcode]
+		if ip+length > size or any(a in dirty for a in range(ip, ip+length)):
+			break
+		instrs.append((ip, opcode, m1, m2, m3))
+		ip += length
+		if opcode == 5 or opcode == 6:
+			break
+	return instrs, ip
+
+def block_source(mem, instrs, end):
+	uses_base = any(i[1] == 9 or 2 in i[2:] for i in instrs)
+	body = []
+	if uses_base:
+		body.append("base = reg[0]")
+	save = "reg[0] = base; " if uses_base else ""
+	for a, opcode, m1, m2, m3 in instrs:
+		n = a + LENGTHS[opcode]
+		if opcode in EXPRS:
+			body.append("d = %s" % target(m3, mem[a+3], a+3))
+			body.append("mem[d] = %s" % (EXPRS[opcode] % (operand(m1, mem[a+1]), operand(m2, mem[a+2]))))
+			body.append("if d in code_cells:")
+			body.append("\tinvalidate(d); %sreturn %d" % (save, n))
+		elif opcode == 9:
+			body.append("base += %s" % operand(m1, mem[a+1]))
+		elif opcode == 5 or opcode == 6:
+			test = '!=' if opcode == 5 else '=='
+			body.append("%sreturn %s if %s %s 0 else %d" % (save, operand(m2, mem[a+2]), operand(m1, mem[a+1]), test, n))
+	if instrs[-1][1] not in (5, 6):
+		body.append("%sreturn %d" % (save, end))
+	src = "def make(mem, reg, code_cells, invalidate):\n"
+	src += "\tdef block():\n"
+	src += ''.join("\t\t%s\n" % line for line in body)
+	src += "\treturn block\n"
+	return src
+
+def block_factory(mem, ip, instrs, end):
+	key = (ip, tuple(mem[a] for a in range(ip, end)))
+	if key not in block_cache:
+		code = compile(block_source(mem, instrs, end), "<intcode block %d>" % ip, 'exec')
+		block_cache[key] = (code, codecache.factory(code))
+	return block_cache[key]
+
+class CompiledCode:
+
+	def __init__(self, mem, cache):
+		self.mem = mem
+		self.reg = [0]
+		self.blocks = dict()
+		self.code_cells = dict()
+		self.dirty = set()
+		self.cache = cache
+
+	def invalidate(self, addr):
+		self.dirty.add(addr)
+		for ip in self.code_cells.pop(addr):
+			self.blocks.pop(ip, None)
+
+	def stored(self, ip):
+		# (end, factory) for the block at ip from the disk cache, if it still
+		# covers the same cells
+		entry = self.cache.get(ip)
+		if entry is None:
+			return None
+		end, cells, code = entry
+		mem = self.mem
+		for a, cell in zip(range(ip, end), cells):
+			if mem[a] != cell or a in self.dirty:
+				return None
+		key = (ip, cells)
+		if key not in block_cache:
+			block_cache[key] = (code, codecache.factory(code))
+		return end, block_cache[key][1]
+
+	def build(self, ip):
+		found = self.stored(ip)
+		if found is not None:
+			end, make = found
+		else:
+			instrs, end = scan(self.mem, ip, self.dirty)
+			if not instrs:
+				return False
+			code, make = block_factory(self.mem, ip, instrs, end)
+			self.cache.put(ip, (end, tuple(self.mem[a] for a in range(ip, end)), code))
+		self.blocks[ip] = make(self.mem, self.reg, self.code_cells, self.invalidate)
+		for addr in range(ip, end):
+			if addr in self.code_cells:
+				self.code_cells[addr].append(ip)
+			else:
+				self.code_cells[addr] = [ip]
+		return True
+
+	def step(self, ip, opcode, m1, m2, m3):
+		# Interpret one compute instruction, returning the next ip
+		mem = self.mem
+		base = self.reg[0]
+		args = []
+		for i, m in enumerate((m1, m2, m3)[:LENGTHS[opcode]-1]):
+			p = mem[ip+1+i]
+			args.append(mem[p] if m == 0 else p if m == 1 else mem[base+p])
+		if opcode == 9:
+			self.reg[0] += args[0]
+			return ip+2
+		if opcode == 5 or opcode == 6:
+			if (args[0] != 0) == (opcode == 5):
+				return args[1]
+			return ip+3
+		A = mem[ip+3]
+		if m3 == 2:
+			A += base
+		elif m3 == 1:
+			A = ip+3
+		C, B = args[0], args[1]
+		if opcode == 1:
+			mem[A] = C + B
+		elif opcode == 2:
+			mem[A] = C * B
+		elif opcode == 7:
+			mem[A] = 1 if C < B else 0
+		else:
+			mem[A] = 1 if C == B else 0
+		if A in self.code_cells:
+			self.invalidate(A)
+		return ip+4
+
+def run(vm):
+	return generate(vm, run_until)
+
+def run_until(vm, limit):
+	outs = []
+	if vm.code is None:
+		vm.code = CompiledCode(vm.mem, codecache.lookup('compiled', VERSION, vm))
+	code = vm.code
+	mem = vm.mem
+	reg = code.reg
+	get = code.blocks.get
+	code_cells = code.code_cells
+	prog_in = vm.prog_in
+	ip = vm.ip_state
+	reg[0] = vm.base
+	while True:
+		b = get(ip)
+		while b is not None:
+			ip = b()
+			b = get(ip)
+		opcode, m1, m2, m3 = decode(mem[ip])
+		if opcode == 3: # Store input at param 1
+			if len(prog_in) == 0:
+				vm.blocked = True
+				vm.ip_state = ip
+				vm.base = reg[0]
+				if outs:
+					vm.last_out = outs[-1]
+				return outs
+			A = mem[ip+1]
+			if m1 == 2:
+				A += reg[0]
+			elif m1 == 1:
+				A = ip+1
+			mem[A] = prog_in.popleft()
+			if A in code_cells:
+				code.invalidate(A)
+			ip += 2
+		elif opcode == 4: # Output value at param 1
+			C = mem[ip+1]
+			if m1 == 0:
+				C = mem[C]
+			elif m1 == 2:
+				C = mem[reg[0]+C]
+			ip += 2
+			outs.append(C)
+			if len(outs) == limit:
+				vm.last_out = C
+				vm.ip_state = ip
+				vm.base = reg[0]
+				return outs
+		elif opcode == 99: # Halt
+			vm.halted = True
+			vm.base = reg[0]
+			if outs:
+				vm.last_out = outs[-1]
+			return outs
+		elif not code.build(ip):
+			ip = code.step(ip, opcode, m1, m2, m3)
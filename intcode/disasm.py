@@ -0,0 +1,194 @@
+"""
+Static disassembler for Intcode images.
+
+	python3 -m intcode.disasm day09_input [entry ...]
+
+Starting from address 0, every reachable instruction is decoded by following
+fall-through and jump edges, without running the program.  Jumps with an
+immediate target are followed directly.  Jumps through memory are resolved
+where the programs' calling convention makes it possible: a call stores an
+immediate return address (usually 21101,ret,0,0 into the new frame) and then
+jumps to the callee, so that constant is treated as code too.
+
+Jumps through cells the program computes at run time (day07 and day23 dispatch
+on their input this way) cannot be followed; extra entry addresses can be
+given for those.
+
+The result gives the instruction listing, jump targets, basic blocks, the
+control-flow graph and an estimate of which cells are code and which are data.
+"""
+
+import sys
+
+from intcode.vm import decode, LENGTHS
+
+NAMES = { 1 : 'add', 2 : 'mul', 3 : 'in', 4 : 'out', 5 : 'jnz', 6 : 'jz', 7 : 'lt', 8 : 'eq', 9 : 'arb', 99 : 'halt' }
+
+class Instruction:
+
+	def __init__(self, addr, image):
+		self.addr = addr
+		self.op = image[addr]
+		self.opcode, m1, m2, m3 = decode(self.op)
+		self.length = LENGTHS[self.opcode]
+		self.modes = (m1, m2, m3)[:self.length-1]
+		if addr + self.length > len(image):
+			raise ValueError("Instruction at %d runs past the image" % addr)
+		self.params = tuple(image[addr+1:addr+self.length])
+
+	def next(self):
+		return self.addr + self.length
+
+	def is_jump(self):
+		return self.opcode == 5 or self.opcode == 6
+
+	def taken(self):
+		# True / False for a jump whose condition is an immediate, else None
+		if not self.is_jump() or self.modes[0] != 1:
+			return None
+		return (self.params[0] != 0) == (self.opcode == 5)
+
+	def target(self):
+		# Jump target when it is an immediate, else None
+		if self.is_jump() and self.modes[1] == 1:
+			return self.params[1]
+		return None
+
+	def falls_through(self):
+		return self.opcode != 99 and self.taken() is not True
+
+	def format_param(self, mode, p):
+		if mode == 1:
+			return '#%d' % p
+		elif mode == 2:
+			return '[rb%+d]' % p
+		return '[%d]' % p
+
+	def __str__(self):
+		args = ', '.join(self.format_param(m, p) for m, p in zip(self.modes, self.params))
+		return ('%-4s %s' % (NAMES[self.opcode], args)).rstrip()
+
+class Disassembly:
+
+	def __init__(self, image, entries=(0,)):
+		self.image = image
+		self.instructions = dict()
+		self.targets = set()
+		self.returns = set()
+		self.indirect = set()
+		self.bad = set()
+		self.trace(entries)
+		self.blocks = dict()
+		self.edges = dict()
+		self.split()
+
+	def trace(self, entries):
+		work = list(entries)
+		while work:
+			addr = work.pop()
+			while 0 <= addr < len(self.image) and addr not in self.instructions:
+				try:
+					ins = Instruction(addr, self.image)
+				except ValueError:
+					self.bad.add(addr)
+					break
+				self.instructions[addr] = ins
+				ret = self.return_site(ins)
+				if ret is not None:
+					self.returns.add(ret)
+					work.append(ret)
+				if ins.is_jump():
+					if ins.target() is not None:
+						if ins.taken() is not False:
+							self.targets.add(ins.target())
+							work.append(ins.target())
+					elif ins.taken() is not False:
+						self.indirect.add(addr)
+				if not ins.falls_through():
+					break
+				addr = ins.next()
+
+	def return_site(self, ins):
+		# A call stores an immediate return address and then jumps away; the stored
+		# value is where the callee will come back to.
+		if ins.opcode not in (1, 2) or ins.modes[0] != 1 or ins.modes[1] != 1:
+			return None
+		value = ins.params[0] + ins.params[1] if ins.opcode == 1 else ins.params[0] * ins.params[1]
+		try:
+			jump = Instruction(ins.next(), self.image)
+		except ValueError:
+			return None
+		if jump.taken() is not True or value != jump.next():
+			return None
+		return value
+
+	def split(self):
+		leaders = { a for a in [0] + sorted(self.targets | self.returns) if a in self.instructions }
+		for ins in self.instructions.values():
+			if ins.is_jump() or ins.opcode == 99:
+				if ins.next() in self.instructions:
+					leaders.add(ins.next())
+		for start in sorted(leaders):
+			block = []
+			addr = start
+			while addr in self.instructions:
+				ins = self.instructions[addr]
+				block.append(ins)
+				addr = ins.next()
+				if ins.is_jump() or ins.opcode == 99 or addr in leaders:
+					break
+			self.blocks[start] = block
+			last = block[-1]
+			succ = []
+			if last.target() is not None and last.taken() is not False:
+				succ.append(last.target())
+			if last.is_jump() and last.target() is None and last.taken() is not False:
+				succ.append('indirect')
+			if last.falls_through() and last.next() in self.instructions:
+				succ.append(last.next())
+			self.edges[start] = succ
+
+	def code_cells(self):
+		cells = set()
+		for ins in self.instructions.values():
+			cells.update(range(ins.addr, ins.next()))
+		return cells
+
+	def data_cells(self):
+		code = self.code_cells()
+		return [ a for a in range(len(self.image)) if a not in code ]
+
+	def listing(self):
+		lines = []
+		for start in sorted(self.blocks):
+			label = 'block_%d' % start
+			if start in self.returns:
+				label += ' (return site)'
+			lines.append('%s:' % label)
+			for ins in self.blocks[start]:
+				lines.append('  %5d  %-28s %s' % (ins.addr, str(ins), ','.join(str(x) for x in (ins.op,) + ins.params)))
+			lines.append('         -> %s' % ', '.join(str(s) for s in self.edges[start]))
+		return '\n'.join(lines)
+
+	def summary(self):
+		code = len(self.code_cells())
+		return {
+			'cells' : len(self.image),
+			'instructions' : len(self.instructions),
+			'code_cells' : code,
+			'data_cells' : len(self.image) - code,
+			'blocks' : len(self.blocks),
+			'jump_targets' : len(self.targets),
+			'return_sites' : len(self.returns),
+			'indirect_jumps' : len(self.indirect),
+		}
+
+if __name__ == "__main__":
+
+	with open(sys.argv[1], 'r') as infile:
+		prog = [ int(x) for x in infile.readline().strip().split(',') ]
+	dis = Disassembly(prog, [0] + [ int(x) for x in sys.argv[2:] ])
+	print(dis.listing())
+	print()
+	for key, value in dis.summary().items():
+		print('%-15s %d' % (key, value))
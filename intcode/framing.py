@@ -0,0 +1,50 @@
+"""
+Fixed-width output records for IntPuterVM.
+
+	screen = Framer(3, vm)
+	for x, y, tile in screen.run_until():
+		...
+
+Several programs speak in records: day11's robot answers (color, turn),
+day13's arcade draws (x, y, tile) and day23's nodes send (dest, x, y).
+A Framer groups a VM's outputs into tuples of width values, in bulk, with one
+zip over the outputs rather than slicing the list a record at a time.  Values
+that do not make up a whole record yet are kept and completed by the next
+run, so a program blocking mid-record loses nothing.
+
+push() frames values from anywhere else, e.g. ones arriving one at a time
+through an asyncio outbox.
+"""
+
+class Framer:
+
+	def __init__(self, width, vm=None):
+		self.width = width
+		self.vm = vm
+		self.partial = [] # outputs of the record not yet complete
+
+	def push(self, values):
+		# Records completed by values, in order
+		if self.partial:
+			values = self.partial + list(values)
+		elif type(values) is not list:
+			values = list(values)
+		whole = len(values) - len(values) % self.width
+		self.partial = values[whole:]
+		return list(zip(*[iter(values)] * self.width))
+
+	def run_until(self, max_records=None):
+		# Records output until the VM blocks or halts, or max_records of them
+		if max_records is None:
+			return self.push(self.vm.run_until())
+		need = max_records * self.width - len(self.partial)
+		return self.push(self.vm.run_until(need) if need > 0 else [])
+
+	def run(self):
+		# Generator of records, like IntPuterVM.run() for single values
+		for value in self.vm.run():
+			self.partial.append(value)
+			if len(self.partial) == self.width:
+				record = tuple(self.partial)
+				self.partial = []
+				yield record
@@ -0,0 +1,80 @@
+"""
+Run many independent Intcode executions across a process pool.
+
+	outputs = run_jobs(prog, [ (x, y) for x in range(50) for y in range(50) ])
+
+Each job is one input sequence; the result is the list of outputs the program
+produced for it before blocking or halting, in the same order as the jobs.
+
+The program image is written once into a multiprocessing.shared_memory block
+as 64-bit cells.  Every worker copies it out of the block when it starts, so
+tasks only carry their inputs and outputs instead of a pickled copy of the
+image each.  An image holding values too large for 64 bits is handed to the
+workers as initializer arguments instead, which is still once per worker.
+
+In place of an image a paused IntPuterVM can be given: its memory, registers
+and pending input become the starting point of every job, so a shared prefix
+(day25's walk round the ship) is run once rather than once per job.
+
+Each worker runs its jobs on an intcode.vmpool.VMPool, so a job resets the
+pages the previous one wrote instead of building a new VM.
+"""
+
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+from intcode.vm import IntPuterVM
+from intcode.vmpool import VMPool
+
+# Per-worker state, set by init_worker
+worker = dict()
+
+def init_worker(name, size, image, ip_state, base, prog_in, backend):
+	if name is not None:
+		shm = shared_memory.SharedMemory(name=name)
+		try:
+			cells = array('q')
+			cells.frombytes(shm.buf[:8*size])
+			image = cells.tolist()
+		finally:
+			shm.close()
+	vm = IntPuterVM(image, paged=True)
+	vm.ip_state = ip_state
+	vm.base = base
+	vm.feed(prog_in)
+	worker['pool'] = VMPool(vm, backend=backend)
+
+def run_job(inputs):
+	return worker['pool'].run(inputs)
+
+def start_state(program):
+	# (image, ip_state, base, pending input) of an image or a paused VM
+	if not isinstance(program, IntPuterVM):
+		return list(program), 0, 0, []
+	if program.halted:
+		raise ValueError("Cannot start jobs from a halted VM")
+	mem = program.mem
+	image = [ mem[addr] for addr in range(len(mem)) ]
+	return image, program.ip_state, program.base, list(program.prog_in)
+
+def run_jobs(program, jobs, workers=None, backend='interp', chunksize=1):
+	image, ip_state, base, prog_in = start_state(program)
+	try:
+		cells = array('q', image)
+	except OverflowError:
+		cells = None
+	shm = None
+	if cells is not None:
+		shm = shared_memory.SharedMemory(create=True, size=max(8*len(cells), 1))
+		shm.buf[:8*len(cells)] = cells.tobytes()
+		initargs = (shm.name, len(cells), None, ip_state, base, prog_in, backend)
+	else:
+		initargs = (None, 0, image, ip_state, base, prog_in, backend)
+	try:
+		with ProcessPoolExecutor(workers, initializer=init_worker, initargs=initargs) as pool:
+			return list(pool.map(run_job, jobs, chunksize=chunksize))
+	finally:
+		if shm is not None:
+			shm.close()
+			shm.unlink()
@@ -0,0 +1,95 @@
+"""
+Shared loader for Intcode puzzle inputs.
+
+	prog = load_program("day09_input")             # fresh list, safe to mutate
+	view = load_program("day09_input", view=True)  # read-only memoryview
+
+The text is parsed once per process with a single map(int) over the split
+line into an array('q').  The cells are also written next to the input as
+<input>.icbin, headed by the SHA-1 of the input text and the number of cells,
+so a later run only reads the file, hashes it and copies the cells straight
+in.  The file is written under a temporary name and renamed into place, and
+one whose size does not match its count is ignored, so a run never picks up
+a cache another process is still writing.  The cache is ignored if the input
+has changed since, and is only a convenience: if it cannot be written the
+loader just parses every time.
+
+Every call returns its own list (the VM pads and writes to the one it is
+given), unless view=True asks for a shared read-only memoryview of the cells.
+An input with values outside 64 bits cannot be held in an array; it is
+returned as a list of Python ints and never given a binary cache, and asking
+for a view of it is an error.
+"""
+
+import hashlib
+import os
+import struct
+from array import array
+
+MAGIC = b'ICB2' # ICBN files had no cell count
+SUFFIX = '.icbin'
+
+# path -> (sha1 of the text, cells as array('q') or list)
+loaded = dict()
+
+def parse(text):
+	values = text.strip().split(',')
+	try:
+		return array('q', map(int, values))
+	except OverflowError:
+		return [ int(x) for x in values ]
+
+def read_cache(path, digest):
+	try:
+		with open(path + SUFFIX, 'rb') as infile:
+			data = infile.read()
+	except OSError:
+		return None
+	header = MAGIC + digest
+	if not data.startswith(header) or len(data) < len(header) + 8:
+		return None
+	size, = struct.unpack('<Q', data[len(header):len(header)+8])
+	body = data[len(header)+8:]
+	if len(body) != 8 * size:
+		return None # cut short, or written by something else
+	cells = array('q')
+	cells.frombytes(body)
+	return cells
+
+def write_cache(path, digest, cells):
+	# Written aside and renamed into place, so a process starting alongside
+	# sees either no cache or a whole one
+	tmp = '%s%s.%d.tmp' % (path, SUFFIX, os.getpid())
+	try:
+		with open(tmp, 'wb') as outfile:
+			outfile.write(MAGIC + digest)
+			outfile.write(struct.pack('<Q', len(cells)))
+			outfile.write(cells.tobytes())
+		os.replace(tmp, path + SUFFIX)
+	except OSError:
+		try:
+			os.remove(tmp)
+		except OSError:
+			pass
+
+def cells_of(path):
+	with open(path, 'rb') as infile:
+		text = infile.read()
+	digest = hashlib.sha1(text).digest()
+	if path in loaded and loaded[path][0] == digest:
+		return loaded[path][1]
+	cells = read_cache(path, digest)
+	if cells is None:
+		cells = parse(text.decode().split('\n')[0])
+		if type(cells) is array:
+			write_cache(path, digest, cells)
+	loaded[path] = (digest, cells)
+	return cells
+
+def load_program(path, view=False):
+	cells = cells_of(path)
+	if view:
+		if type(cells) is not array:
+			raise ValueError("%s holds values too large for a view" % path)
+		return memoryview(cells).toreadonly()
+	return cells.tolist() if type(cells) is array else list(cells)
@@ -0,0 +1,271 @@
+"""
+Subroutine memoization for IntPuterVM.
+
+	memo = vm.memoize()
+	...run the VM...
+	memo.hits, memo.calls   # calls answered from the table, calls seen
+	vm.unmemoize()
+
+While memoizing, run() and run_until() go through the loop in this module,
+whatever the backend (the same way as watch()).  It recognises the calling
+convention the puzzle programs use: the caller stores the return address in
+[rb+0] and jumps to the subroutine with an immediate target, and the
+subroutine moves the base, works in the cells above it, moves the base back
+and jumps through [rb+0].  So a call is a taken jump with an immediate target
+at ip while [base] == ip+3, and it has returned once execution is back at ip+3
+with the same base.
+
+Each call is recorded as it runs: every cell it reads before writing it
+(the arguments, the return address, constants) and the last value of every
+cell it writes.  Cells reached through relative mode are kept as offsets from
+the caller's base, the rest as absolute addresses, so one record covers the
+subroutine at any stack depth.  Execution is deterministic, so a later call
+to the same address finding the same values in those cells would do exactly
+the same: the loop writes the recorded values and carries on at the return
+address without running the body.  Calls made inside a recorded call are
+answered or recorded too, which is what turns day09's f(n-1) + f(n-3) from
+exponential into linear.
+
+Purity is checked on the way rather than assumed.  A subroutine that does
+input or output while being recorded is marked impure and never recorded
+again.  Writes outside the frame (day09's compare result in [63]) are
+allowed; they are part of the record and replayed with the rest.  A record
+whose frame cells could overlap the absolute cells it touches is not kept,
+and a write to any cell the loop has executed as code empties the table,
+since the records assume the code does not change.  Cells changed from
+outside the VM (a puzzle's patched noun and verb) must be changed before
+memoize().
+"""
+
+from intcode.vm import decode, generate, LENGTHS
+
+READ = 0
+WRITE = 1
+
+class Frame:
+
+	def __init__(self, target, base, ret, start):
+		self.target = target # entry address of the subroutine
+		self.base = base # caller's base, restored on return
+		self.ret = ret # return address
+		self.start = start # index in the access log where the call began
+
+class Memo:
+
+	def __init__(self, limit=1 << 20):
+		self.table = dict() # entry address -> (offsets, addresses) read -> values -> record
+		self.impure = set() # entry addresses seen doing I/O
+		self.code = set() # cells fetched as instructions or their parameters
+		self.limit = limit # longest access log kept before recording is abandoned
+		self.calls = 0
+		self.hits = 0
+		self.recorded = 0
+
+	def clear(self):
+		self.table.clear()
+
+	def lookup(self, mem, target, base):
+		# Record for a call to target from base, or None
+		variants = self.table.get(target)
+		if variants is None:
+			return None
+		for (offsets, addrs), records in variants.items():
+			values = tuple([ mem[base+o] for o in offsets ] + [ mem[a] for a in addrs ])
+			record = records.get(values)
+			if record is not None and base + record[2] > record[3]:
+				return (offsets, addrs, values, record)
+		return None
+
+	def record(self, frame, log):
+		# Store what the call traced in log[frame.start:] did, if it is safe to
+		# replay at another base
+		base = frame.base
+		reads = dict()
+		writes = dict()
+		rel = set()
+		absolute = set()
+		for kind, addr, value, relative in log[frame.start:]:
+			(rel if relative else absolute).add(addr)
+			if kind == WRITE:
+				writes[addr] = value
+			elif addr not in writes and addr not in reads:
+				reads[addr] = value
+		low = min(rel) if rel else None
+		high = max(absolute) if absolute else -1
+		if low is not None and low <= high:
+			return # relative and absolute cells may alias
+		offsets = tuple(sorted(a - base for a in reads if a in rel))
+		addrs = tuple(sorted(a for a in reads if a not in rel))
+		values = tuple([ reads[base+o] for o in offsets ] + [ reads[a] for a in addrs ])
+		rwrites = tuple((a - base, v) for a, v in writes.items() if a in rel)
+		awrites = tuple((a, v) for a, v in writes.items() if a not in rel)
+		low = 0 if low is None else low - base
+		variants = self.table.setdefault(frame.target, dict())
+		variants.setdefault((offsets, addrs), dict())[values] = (rwrites, awrites, low, high)
+		self.recorded += 1
+
+def execute(vm, limit):
+	# The interpreter with call memoization; like IntPuterVM.interpret_until
+	memo = vm.memo
+	code = memo.code
+	impure = memo.impure
+	outs = []
+	mem = vm.mem
+	decoded = vm.decoded
+	prog_in = vm.prog_in
+	ip = vm.ip_state
+	base = vm.base
+	ops = dict() # instruction value -> decoded
+	frames = [] # calls being recorded, innermost last
+	log = [] # (kind, addr, value, relative) for every access while recording
+
+	def abandon(mark):
+		if mark:
+			impure.update(frame.target for frame in frames)
+		frames.clear()
+		log.clear()
+
+	while True:
+		op = mem[ip]
+		if op not in ops:
+			ops[op] = decode(op)
+		opcode, m1, m2, m3 = ops[op]
+		if ip not in code:
+			code.update(range(ip, ip + LENGTHS[opcode]))
+		if opcode == 1 or opcode == 2 or opcode == 7 or opcode == 8:
+			C = mem[ip+1]
+			if m1 != 1:
+				if m1 == 2:
+					C += base
+				if frames:
+					log.append((READ, C, mem[C], m1 == 2))
+				C = mem[C]
+			B = mem[ip+2]
+			if m2 != 1:
+				if m2 == 2:
+					B += base
+				if frames:
+					log.append((READ, B, mem[B], m2 == 2))
+				B = mem[B]
+			A = mem[ip+3]
+			if m3 == 2:
+				A += base
+			elif m3 == 1:
+				A = ip+3
+			if opcode == 1:
+				R = C + B
+			elif opcode == 2:
+				R = C * B
+			elif opcode == 7:
+				R = 1 if C < B else 0
+			else:
+				R = 1 if C == B else 0
+			mem[A] = R
+			if A in decoded:
+				del decoded[A]
+			if A in code:
+				memo.clear()
+				abandon(True)
+			if frames:
+				log.append((WRITE, A, R, m3 == 2))
+			ip += 4
+		elif opcode == 5 or opcode == 6:
+			C = mem[ip+1]
+			if m1 != 1:
+				if m1 == 2:
+					C += base
+				if frames:
+					log.append((READ, C, mem[C], m1 == 2))
+				C = mem[C]
+			if (C != 0) == (opcode == 5):
+				T = mem[ip+2]
+				if m2 != 1:
+					if m2 == 2:
+						T += base
+					if frames:
+						log.append((READ, T, mem[T], m2 == 2))
+					T = mem[T]
+				elif mem[base] == ip+3 and T not in impure:
+					# A call
+					memo.calls += 1
+					found = memo.lookup(mem, T, base)
+					if found is not None:
+						offsets, addrs, values, (rwrites, awrites, low, high) = found
+						if frames:
+							log.extend((READ, base+o, v, True) for o, v in zip(offsets, values))
+							log.extend((READ, a, v, False) for a, v in zip(addrs, values[len(offsets):]))
+							log.extend((WRITE, base+o, v, True) for o, v in rwrites)
+							log.extend((WRITE, a, v, False) for a, v in awrites)
+						for o, v in rwrites:
+							mem[base+o] = v
+						for a, v in awrites:
+							mem[a] = v
+							if a in decoded:
+								del decoded[a]
+						memo.hits += 1
+						ip += 3
+						continue
+					frames.append(Frame(T, base, ip+3, len(log)))
+				ip = T
+				if frames and ip == frames[-1].ret and base == frames[-1].base:
+					memo.record(frames.pop(), log)
+					if not frames:
+						log.clear()
+				elif len(log) > memo.limit:
+					abandon(False)
+			else:
+				ip += 3
+		elif opcode == 9:
+			C = mem[ip+1]
+			if m1 != 1:
+				if m1 == 2:
+					C += base
+				if frames:
+					log.append((READ, C, mem[C], m1 == 2))
+				C = mem[C]
+			base += C
+			ip += 2
+		elif opcode == 3:
+			if frames:
+				abandon(True)
+			if len(prog_in) == 0:
+				vm.blocked = True
+				vm.ip_state = ip
+				vm.base = base
+				return outs
+			A = mem[ip+1]
+			if m1 == 2:
+				A += base
+			elif m1 == 1:
+				A = ip+1
+			mem[A] = prog_in.popleft()
+			if A in decoded:
+				del decoded[A]
+			if A in code:
+				memo.clear()
+			ip += 2
+		elif opcode == 4:
+			if frames:
+				abandon(True)
+			C = mem[ip+1]
+			if m1 != 1:
+				if m1 == 2:
+					C += base
+				C = mem[C]
+			ip += 2
+			outs.append(C)
+			vm.last_out = C
+			if len(outs) == limit:
+				vm.ip_state = ip
+				vm.base = base
+				return outs
+		else: # Halt
+			vm.halted = True
+			vm.base = base
+			return outs
+
+def run(vm):
+	return generate(vm, execute)
+
+def run_until(vm, limit):
+	return execute(vm, limit)
@@ -0,0 +1,104 @@
+"""
+Paged sparse memory for IntPuterVM.
+
+Memory is split into fixed-size pages that are only allocated when something
+is written to them.  Reads from a page that was never written are 0, so
+there is no upper address limit and a VM only pays for the pages it actually
+touches.  Negative addresses are invalid: reading or writing one raises
+IndexError.
+
+With typed=True pages are array('q') buffers, which are compact and copy with
+a single memcpy.  A page that is asked to hold a value outside 64 bits is
+promoted to a plain list of Python ints, so large-number programs (day09's
+BOOST checks) still work.
+
+fork() gives a copy that shares every page with the original.  Each side only
+writes in place to pages it owns, and takes a private copy of a shared page on
+its first write to it, so a fork costs O(pages) up front and O(pages written)
+afterwards rather than O(memory).
+"""
+
+from array import array
+
+PAGE_BITS = 10
+PAGE_SIZE = 1 << PAGE_BITS
+PAGE_MASK = PAGE_SIZE - 1
+
+ZERO_PAGE = (0,) * PAGE_SIZE
+
+class PagedMemory:
+
+	def __init__(self, image=(), typed=False):
+		self.typed = typed
+		self.pages = dict()
+		self.owned = set() # pages this memory may write in place
+		for addr in range(0, len(image), PAGE_SIZE):
+			page = list(image[addr:addr+PAGE_SIZE])
+			page += [0] * (PAGE_SIZE - len(page))
+			self.pages[addr >> PAGE_BITS] = self.new_page(page)
+			self.owned.add(addr >> PAGE_BITS)
+
+	def new_page(self, values):
+		if self.typed:
+			try:
+				return array('q', values)
+			except OverflowError:
+				pass
+		return list(values)
+
+	def promote(self, n):
+		# Page n needs arbitrary precision from now on
+		self.pages[n] = list(self.pages[n])
+
+	def __getitem__(self, addr):
+		page = self.pages.get(addr >> PAGE_BITS)
+		if page is None:
+			if addr < 0:
+				raise IndexError("Negative address %d" % addr)
+			return 0
+		return page[addr & PAGE_MASK]
+
+	def __setitem__(self, addr, value):
+		n = addr >> PAGE_BITS
+		if n not in self.owned:
+			if addr < 0:
+				raise IndexError("Negative address %d" % addr)
+			if n in self.pages:
+				self.pages[n] = self.pages[n][:]
+			else:
+				self.pages[n] = self.new_page(ZERO_PAGE)
+			self.owned.add(n)
+		try:
+			self.pages[n][addr & PAGE_MASK] = value
+		except OverflowError:
+			self.promote(n)
+			self.pages[n][addr & PAGE_MASK] = value
+
+	def __len__(self):
+		# Extent covered by resident pages
+		if not self.pages:
+			return 0
+		return (max(self.pages) + 1) << PAGE_BITS
+
+	def fork(self):
+		mem = PagedMemory(typed=self.typed)
+		mem.pages = self.pages.copy()
+		self.owned = set()
+		return mem
+
+	# Copy-on-write is indistinguishable from a real copy
+	copy = fork
+
+	def resident(self):
+		return len(self.pages)
+
+	def private(self):
+		# Pages not shared with any fork
+		return len(self.owned)
+
+	def promoted(self):
+		return sum(1 for page in self.pages.values() if type(page) is list)
+
+	def footprint(self):
+		# Approximate bytes held by resident pages, one pointer per list cell
+		return sum(page.itemsize * PAGE_SIZE if type(page) is array else 8 * PAGE_SIZE for page in self.pages.values())
@@ -0,0 +1,233 @@
+"""
+Load-time peephole optimizer for Intcode images.
+
+	image, stats = optimize(image)
+
+Works one basic block at a time on the code found by intcode.disasm:
+
+	- position reads of cells whose value is known inside the block become
+	  immediates, and arithmetic or compares on constants are folded into a
+	  single constant store (1101,c,0,dst)
+	- jumps whose condition is known become direct jumps or are dropped
+	- direct jumps to a block that is only a direct jump go straight to where
+	  that one leads
+	- stores overwritten later in the block with no read in between are dropped
+	- the surviving instructions are packed to the front of the block and
+	  followed by a jump to the block's old continuation, so the block runs in
+	  fewer steps; a block that would not get shorter keeps its layout, with
+	  the rewritten instructions substituted in place and the dead ones left
+
+The stats count only changes that were written into the image.
+
+Intcode has no NOP and code shares memory with data, so rewriting is only safe
+for cells the program never treats as data.  The optimizer leaves the image
+alone unless every jump through memory is a subroutine return (relative mode)
+and the program moves its relative base past its own end before any relative
+access, so that stack traffic cannot reach the code.  Instructions whose cells
+are read or written as data through position mode, or listed in protect (for
+cells the caller pokes after loading, like day13's mem[0] = 2), are never
+changed.  I/O instructions are kept in order and act as barriers.
+"""
+
+import sys
+
+from intcode.disasm import Disassembly
+
+JUMP = 1105 # jump-if-true with immediate condition and target
+
+# Parameters each opcode reads (the write target of 1, 2, 3, 7, 8 is not a read)
+READS = { 1 : 2, 2 : 2, 3 : 0, 4 : 1, 5 : 2, 6 : 2, 7 : 2, 8 : 2, 9 : 1, 99 : 0 }
+
+def encode(opcode, modes):
+	op = opcode
+	for i, m in enumerate(modes):
+		op += m * 10 ** (i+2)
+	return op
+
+def stack_is_clear(dis):
+	# On every path from the entry, the first base adjust must be an immediate
+	# moving the base past the image, and no relative access may come before it.
+	seen = set()
+	work = [0]
+	while work:
+		start = work.pop()
+		if start in seen or start not in dis.blocks:
+			continue
+		seen.add(start)
+		for ins in dis.blocks[start]:
+			if ins.opcode == 9:
+				if ins.modes[0] != 1 or ins.params[0] < len(dis.image):
+					return False
+				break
+			if 2 in ins.modes:
+				return False
+		else:
+			for succ in dis.edges[start]:
+				if succ == 'indirect':
+					return False
+				work.append(succ)
+	return True
+
+def data_cells(dis):
+	# Cells accessed as data through position mode anywhere in the traced code
+	cells = set()
+	for ins in dis.instructions.values():
+		for m, p in zip(ins.modes, ins.params):
+			if m == 0:
+				cells.add(p)
+	return cells
+
+class Rewriter:
+
+	def __init__(self, image, protect):
+		self.image = image
+		self.dis = Disassembly(image)
+		self.out = image[:]
+		self.stats = { 'folded' : 0, 'propagated' : 0, 'jumps_resolved' : 0, 'jumps_threaded' : 0, 'dead_stores' : 0, 'blocks_packed' : 0, 'steps_saved' : 0 }
+		self.reason = None
+		if self.dis.indirect and any(self.dis.instructions[a].modes[1] != 2 for a in self.dis.indirect):
+			self.reason = 'jumps through computed cells'
+		elif not stack_is_clear(self.dis):
+			self.reason = 'relative base does not start past the image'
+		self.fixed = set(protect) | data_cells(self.dis)
+
+	def frozen(self, ins):
+		# Instructions that must stay exactly as they are
+		if ins.opcode in (1, 2, 7, 8) and ins.modes[2] == 1:
+			return True
+		return any(a in self.fixed for a in range(ins.addr, ins.next()))
+
+	def thread(self, target):
+		# Follow chains of blocks that are a single unconditional direct jump
+		seen = set()
+		while target in self.dis.blocks and target not in seen:
+			seen.add(target)
+			block = self.dis.blocks[target]
+			ins = block[0]
+			if len(block) != 1 or ins.taken() is not True or ins.target() is None or self.frozen(ins):
+				break
+			target = ins.target()
+		return target
+
+	def run(self):
+		if self.reason is None:
+			for start, block in self.dis.blocks.items():
+				if not any(self.frozen(ins) for ins in block):
+					self.rewrite(block)
+		return self.out, self.stats
+
+	def rewrite(self, block):
+		known = dict() # position cell -> constant value
+		pending = dict() # position cell -> index of a store not read since
+		kept = [] # [opcode, modes, params, live, stats it counts towards once written]
+		for ins in block:
+			opcode = ins.opcode
+			modes = list(ins.modes)
+			params = list(ins.params)
+			# Substitute known position reads
+			n_reads = READS[opcode]
+			substituted = False
+			counts = []
+			for i in range(n_reads):
+				if modes[i] == 0 and params[i] in known:
+					modes[i] = 1
+					params[i] = known[params[i]]
+					substituted = True
+					counts.append('propagated')
+			# Whatever is still read keeps earlier stores alive
+			for i in range(n_reads):
+				if modes[i] == 0:
+					pending.pop(params[i], None)
+				elif modes[i] == 2:
+					pending.clear()
+			entry = [opcode, modes, params, True, counts]
+			if opcode in (1, 2, 7, 8):
+				if modes[0] == 1 and modes[1] == 1:
+					a, b = params[0], params[1]
+					c = { 1 : a + b, 2 : a * b, 7 : int(a < b), 8 : int(a == b) }[opcode]
+					if substituted:
+						# Already-constant stores are left as the program wrote them
+						entry = [1, [1, 1, modes[2]], [c, 0, params[2]], True, counts + ['folded']]
+				if modes[2] == 0:
+					dst = params[2]
+					if dst in pending:
+						kept[pending[dst]][3:] = [False, ['dead_stores']]
+					pending[dst] = len(kept)
+					if modes[0] == 1 and modes[1] == 1:
+						known[dst] = c
+					else:
+						known.pop(dst, None)
+				else:
+					known.clear()
+			elif opcode == 3 or opcode == 4:
+				# Blocking or yielding exposes memory to the caller
+				pending.clear()
+				known.clear()
+			elif opcode == 5 or opcode == 6:
+				if modes[0] == 1:
+					taken = (params[0] != 0) == (opcode == 5)
+					if not taken:
+						entry[3:] = [False, ['jumps_resolved']]
+					elif substituted:
+						entry = [5, [1, modes[1]], [1, params[1]], True, counts + ['jumps_resolved']]
+				if entry[3] and entry[1][1] == 1:
+					target = self.thread(entry[2][1])
+					if target != entry[2][1]:
+						entry[2][1] = target
+						entry[4] = entry[4] + ['jumps_threaded']
+			kept.append(entry)
+		self.pack(block, kept)
+
+	def pack(self, block, kept):
+		# Stats are only counted for changes that make it into the image
+		start = block[0].addr
+		end = block[-1].next()
+		cells = []
+		steps = 0
+		for opcode, modes, params, live, counts in kept:
+			if live:
+				cells.append(encode(opcode, modes))
+				cells.extend(params)
+				steps += 1
+		last = [ k for k in kept if k[3] ]
+		# Does control reach the end of the block (and so the next one)?
+		falls = block[-1].opcode != 99
+		if last and last[-1][0] in (5, 6) and last[-1][1][0] == 1:
+			falls = False # ends in an unconditional jump
+		if len(cells) < end - start and falls:
+			cells.extend([JUMP, 1, end])
+			steps += 1
+		if len(cells) > end - start or steps >= len(block):
+			# Keep the block's layout, substituting the live rewrites in place;
+			# every rewrite keeps its instruction's length, and dead instructions
+			# stay as they were
+			for ins, (opcode, modes, params, live, counts) in zip(block, kept):
+				op = [encode(opcode, modes)] + params
+				if live and len(op) == ins.next() - ins.addr and op != self.out[ins.addr:ins.next()]:
+					self.out[ins.addr:ins.next()] = op
+					self.count(counts)
+			return
+		self.out[start:start+len(cells)] = cells
+		for entry in kept:
+			self.count(entry[4])
+		self.stats['blocks_packed'] += 1
+		self.stats['steps_saved'] += len(block) - steps
+
+	def count(self, counts):
+		for key in counts:
+			self.stats[key] += 1
+
+def optimize(image, protect=()):
+	rw = Rewriter(image, protect)
+	out, stats = rw.run()
+	stats['skipped'] = rw.reason
+	return out, stats
+
+if __name__ == "__main__":
+
+	with open(sys.argv[1], 'r') as infile:
+		prog = [ int(x) for x in infile.readline().strip().split(',') ]
+	out, stats = optimize(prog, [ int(x) for x in sys.argv[2:] ])
+	for key, value in stats.items():
+		print('%-15s %s' % (key, value))
+	print('cells changed  ', sum(1 for a, b in zip(prog, out) if a != b))
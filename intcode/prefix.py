@@ -0,0 +1,146 @@
+"""
+Cache of paused VMs keyed by the inputs they have consumed.
+
+	cache = PrefixCache(capacity=4096, paged=True)
+	outs = cache.run(prog, (x, y))
+
+run() gives the same outputs as feeding all the inputs to a fresh VM and
+running it until it blocks or halts.  On the way it keeps, for every prefix of
+the inputs, a fork of the VM as it stood waiting for the next value, in a trie
+per program (keyed by a hash of the image).  A later query walks the trie as
+far as its inputs match, picks up the outputs already recorded along that
+path, and only runs the VM from the deepest match onwards, so queries that
+share their first inputs (day19's fixed x, a command script's opening moves)
+do not boot from address 0 each time.
+
+Inputs are fed one at a time, each time running the VM until it asks for the
+next one, so every node is a point where the program is blocked on input.
+Once a VM halts, further inputs are not consumed and no deeper nodes exist.
+
+A query's run also hands its decode cache back to the node it started from,
+for every address whose cell still matches there, so later forks of that node
+start warm instead of decoding the program again.
+
+The cache holds at most capacity nodes.  A node counts as used whenever a
+query passes through it, and ancestors are always marked after their
+descendants, so the least recently used node is a leaf and evicting it never
+strands a subtree or the path a query is still extending.  A capacity
+smaller than one query's path just stops caching that query deeper.
+"""
+
+import hashlib
+from collections import OrderedDict
+
+from intcode.vm import IntPuterVM
+
+def program_hash(image):
+	return hashlib.sha1(','.join(str(x) for x in image).encode()).hexdigest()
+
+class Node:
+
+	def __init__(self, key, vm, outs):
+		self.key = key # (program hash, input prefix)
+		self.vm = vm # paused after consuming the prefix, not to be run itself
+		self.outs = outs # outputs made since the parent node
+		self.children = dict()
+
+class PrefixCache:
+
+	def __init__(self, capacity=4096, **vm_options):
+		self.capacity = capacity
+		self.vm_options = vm_options
+		self.nodes = OrderedDict() # key -> Node, least recently used first
+		self.programs = dict() # id of an image -> (copy of it, its hash)
+		self.hits = 0 # inputs answered from the trie
+		self.misses = 0 # inputs that had to be run
+
+	def program(self, image):
+		# Hash of image, remembered for as long as the same list is unchanged
+		known = self.programs.get(id(image))
+		if known is None or known[0] != image:
+			known = (list(image), program_hash(image))
+			self.programs[id(image)] = known
+		return known[1]
+
+	def warm(self, node, vm):
+		# Give node's VM the decode cache entries vm built that are valid for it
+		mem = node.vm.mem
+		decoded = node.vm.decoded
+		for ip, entry in vm.decoded.items():
+			if ip not in decoded and mem[ip] == vm.mem[ip]:
+				decoded[ip] = entry
+
+	def touch(self, path):
+		# Mark the nodes on path (root first) as just used, deepest first, so
+		# that a node is always more recently used than everything below it and
+		# the least recently used node is a leaf off the current path
+		for node in reversed(path):
+			self.nodes.move_to_end(node.key)
+
+	def add(self, node, path):
+		# Add node below the last node of path, then evict down to capacity
+		self.nodes[node.key] = node
+		self.touch(path + [node])
+		while len(self.nodes) > self.capacity:
+			key, old = self.nodes.popitem(last=False)
+			self.drop(old)
+
+	def drop(self, node):
+		# Remove node and everything below it
+		program, prefix = node.key
+		if prefix:
+			parent = self.nodes.get((program, prefix[:-1]))
+			if parent is not None:
+				parent.children.pop(prefix[-1], None)
+		work = list(node.children.values())
+		while work:
+			child = work.pop()
+			self.nodes.pop(child.key, None)
+			work.extend(child.children.values())
+
+	def root(self, image, program):
+		key = (program, ())
+		node = self.nodes.get(key)
+		if node is None:
+			vm = IntPuterVM(list(image), **self.vm_options)
+			node = Node(key, vm, vm.run_until())
+			self.add(node, [])
+		return node
+
+	def run(self, image, inputs):
+		program = self.program(image)
+		node = self.root(image, program)
+		path = [node]
+		outs = list(node.outs)
+		inputs = list(inputs)
+		depth = 0
+		while depth < len(inputs) and inputs[depth] in node.children:
+			node = node.children[inputs[depth]]
+			path.append(node)
+			outs.extend(node.outs)
+			depth += 1
+		self.touch(path)
+		self.hits += depth
+		if node.vm.halted:
+			return outs
+		start = node
+		vm = node.vm.fork()
+		for value in inputs[depth:]:
+			self.misses += 1
+			vm.buffer_read(value)
+			step = vm.run_until()
+			outs.extend(step)
+			if path is not None:
+				child = Node((program, tuple(inputs[:depth+1])), vm.fork(), step)
+				node.children[value] = child
+				self.add(child, path)
+				if child.key in self.nodes:
+					path.append(child)
+					node = child
+				else:
+					path = None # capacity is below the path's length, stop caching it
+			depth += 1
+			if vm.halted:
+				break
+		self.warm(start, vm)
+		return outs
@@ -0,0 +1,116 @@
+"""
+Execution profiler for IntPuterVM.
+
+	prof = vm.start_profile()
+	...run the VM...
+	vm.stop_profile()
+	prof.save("day09.profile.json")
+
+While profiling, the VM runs on the interpreter whatever its backend is, with
+its decode cache swapped for a CountingCache.  The interpreter touches the
+decode cache exactly once per instruction (a lookup on a hit, a store on a
+miss), so the cache sees every step without any extra test in the hot loop;
+an unprofiled VM keeps its plain dict and pays nothing.
+
+Counts are kept per (address, instruction value), so opcode, mode combination
+and address totals stay exact even for self-modifying programs.
+
+start_profile(stacks=True) also rebuilds the program's call stack as it runs
+and counts steps per stack (intcode/stacks.py), for flame graphs of which
+subroutines are hot.
+"""
+
+import json
+from time import perf_counter
+
+class CountingCache(dict):
+
+	def __init__(self, entries, mem, hits):
+		dict.__init__(self, entries)
+		self.mem = mem
+		self.hits = hits
+
+	def __getitem__(self, ip):
+		key = (ip, self.mem[ip])
+		self.hits[key] = self.hits.get(key, 0) + 1
+		return dict.__getitem__(self, ip)
+
+	def __setitem__(self, ip, entry):
+		key = (ip, self.mem[ip])
+		self.hits[key] = self.hits.get(key, 0) + 1
+		dict.__setitem__(self, ip, entry)
+
+class Profile:
+
+	def __init__(self):
+		self.hits = dict()
+		self.wall = 0.0
+		self.stacks = None # intcode.stacks.CallStacks when started with stacks=True
+
+	def steps(self):
+		return sum(self.hits.values())
+
+	def by_opcode(self):
+		counts = dict()
+		for (ip, op), n in self.hits.items():
+			counts[op % 100] = counts.get(op % 100, 0) + n
+		return counts
+
+	def by_modes(self):
+		# Keyed by the instruction value, e.g. 1101 is add with two immediates
+		counts = dict()
+		for (ip, op), n in self.hits.items():
+			counts[op] = counts.get(op, 0) + n
+		return counts
+
+	def by_address(self):
+		counts = dict()
+		for (ip, op), n in self.hits.items():
+			counts[ip] = counts.get(ip, 0) + n
+		return counts
+
+	def report(self):
+		steps = self.steps()
+		report = {
+			'steps' : steps,
+			'wall_time' : self.wall,
+			'steps_per_second' : steps / self.wall if self.wall else None,
+			'opcodes' : { str(k) : v for k, v in sorted(self.by_opcode().items()) },
+			'modes' : { str(k) : v for k, v in sorted(self.by_modes().items()) },
+			'addresses' : { str(k) : v for k, v in sorted(self.by_address().items()) },
+		}
+		if self.stacks is not None:
+			report['functions'] = { str(k) : { 'self' : own, 'total' : total }
+				for k, (own, total) in sorted(self.stacks.functions().items()) }
+		return report
+
+	def to_json(self):
+		return json.dumps(self.report(), indent=1)
+
+	def save(self, path):
+		with open(path, 'w') as outfile:
+			outfile.write(self.to_json())
+
+def run(vm):
+	prof = vm.profile
+	start = perf_counter()
+	try:
+		steps = vm.interpret() if prof.stacks is None else prof.stacks.run(vm)
+		for out in steps:
+			prof.wall += perf_counter() - start
+			start = None # time spent suspended is the caller's
+			yield out
+			start = perf_counter()
+	finally:
+		if start is not None:
+			prof.wall += perf_counter() - start
+
+def run_until(vm, limit):
+	prof = vm.profile
+	start = perf_counter()
+	try:
+		if prof.stacks is not None:
+			return prof.stacks.run_until(vm, limit)
+		return vm.interpret_until(limit)
+	finally:
+		prof.wall += perf_counter() - start
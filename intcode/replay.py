@@ -0,0 +1,264 @@
+"""
+Deterministic record and replay of IntPuterVM runs.
+
+	rec = Recorder(vm, every=100000)
+	rec.feed(values)
+	outs = rec.run_until()        # like vm.run_until(), but logged
+	rec.recording.save("day13.rec")
+
+	rep = Replay(Recording.load("day13.rec"))
+	vm = rep.seek(2500000)        # the VM just before instruction 2500000
+	outs = rep.verify()           # rerun everything and check the outputs
+
+A recording holds every input the program consumed and every output it
+produced, each tagged with the instruction count at which it happened, and a
+checkpoint (a forked VM plus its instruction pointer) every `every`
+instructions.  The program is deterministic given its inputs, so seek()
+restores the last checkpoint at or before the wanted step and replays at most
+`every` instructions from there, feeding inputs from the log.
+
+Recording and replay run in their own loop that counts single instructions.
+It is slower than the interpreter and is meant for chasing a bug, not for solving.
+Memory writes keep the VM's decode cache valid, so a VM can go back to plain
+run() afterwards; translations for the closure and compiled backends are
+dropped and rebuilt on their next run.
+
+On disk a recording is a directory with the log as log.json and each
+checkpoint as an intcode.snapshot file.
+"""
+
+import json
+import os
+from collections import deque
+
+from intcode.vm import decode
+from intcode import snapshot
+
+LIMIT = 'limit'
+BLOCK = 'block'
+HALT = 'halt'
+
+def execute(vm, ip, limit, steps, inputs, outputs):
+	# Run at most limit instructions from ip, logging (step, value) for each
+	# input taken and output made.  Returns (ip, instructions run, status).
+	mem = vm.mem
+	decoded = vm.decoded
+	prog_in = vm.prog_in
+	base = vm.base
+	ops = dict() # instruction value -> decoded
+	done = 0
+	while done < limit:
+		op = mem[ip]
+		if op not in ops:
+			ops[op] = decode(op)
+		opcode, m1, m2, m3 = ops[op]
+		if opcode == 1 or opcode == 2 or opcode == 7 or opcode == 8:
+			C = mem[ip+1]
+			if m1 == 0:
+				C = mem[C]
+			elif m1 == 2:
+				C = mem[base+C]
+			B = mem[ip+2]
+			if m2 == 0:
+				B = mem[B]
+			elif m2 == 2:
+				B = mem[base+B]
+			A = mem[ip+3]
+			if m3 == 2:
+				A += base
+			elif m3 == 1:
+				A = ip+3
+			if opcode == 1:
+				mem[A] = C + B
+			elif opcode == 2:
+				mem[A] = C * B
+			elif opcode == 7:
+				mem[A] = 1 if C < B else 0
+			else:
+				mem[A] = 1 if C == B else 0
+			if A in decoded:
+				del decoded[A]
+			ip += 4
+		elif opcode == 5 or opcode == 6:
+			C = mem[ip+1]
+			if m1 == 0:
+				C = mem[C]
+			elif m1 == 2:
+				C = mem[base+C]
+			if (C != 0) == (opcode == 5):
+				ip = mem[ip+2]
+				if m2 == 0:
+					ip = mem[ip]
+				elif m2 == 2:
+					ip = mem[base+ip]
+			else:
+				ip += 3
+		elif opcode == 9:
+			C = mem[ip+1]
+			if m1 == 0:
+				C = mem[C]
+			elif m1 == 2:
+				C = mem[base+C]
+			base += C
+			ip += 2
+		elif opcode == 3:
+			if len(prog_in) == 0:
+				vm.blocked = True
+				vm.ip_state = ip
+				vm.base = base
+				return ip, done, BLOCK
+			A = mem[ip+1]
+			if m1 == 2:
+				A += base
+			elif m1 == 1:
+				A = ip+1
+			value = prog_in.popleft()
+			inputs.append((steps+done, value))
+			mem[A] = value
+			if A in decoded:
+				del decoded[A]
+			ip += 2
+		elif opcode == 4:
+			C = mem[ip+1]
+			if m1 == 0:
+				C = mem[C]
+			elif m1 == 2:
+				C = mem[base+C]
+			outputs.append((steps+done, C))
+			vm.last_out = C
+			ip += 2
+		else: # Halt
+			vm.halted = True
+			vm.base = base
+			return ip, done, HALT
+		done += 1
+	vm.base = base
+	return ip, done, LIMIT
+
+class Recording:
+
+	def __init__(self, every):
+		self.every = every
+		self.inputs = [] # (step, value) for every input consumed
+		self.outputs = [] # (step, value) for every output produced
+		self.checkpoints = [] # (step, ip, VM at that point), in step order
+
+	def checkpoint(self, step, ip, vm):
+		cp = vm.fork()
+		cp.ip_state = ip
+		cp.prog_in.clear() # replay feeds inputs from the log
+		self.checkpoints.append((step, ip, cp))
+
+	def nearest(self, step):
+		# Last checkpoint at or before step
+		best = self.checkpoints[0]
+		for cp in self.checkpoints:
+			if cp[0] > step:
+				break
+			best = cp
+		return best
+
+	def save(self, path):
+		os.makedirs(path, exist_ok=True)
+		log = {
+			'every' : self.every,
+			'inputs' : self.inputs,
+			'outputs' : self.outputs,
+			'checkpoints' : [ (step, ip) for step, ip, cp in self.checkpoints ],
+		}
+		with open(os.path.join(path, 'log.json'), 'w') as outfile:
+			json.dump(log, outfile)
+		for step, ip, cp in self.checkpoints:
+			snapshot.save(cp, os.path.join(path, 'cp_%d.icvm' % step))
+
+	@classmethod
+	def load(cls, path):
+		with open(os.path.join(path, 'log.json'), 'r') as infile:
+			log = json.load(infile)
+		rec = cls(log['every'])
+		rec.inputs = [ tuple(x) for x in log['inputs'] ]
+		rec.outputs = [ tuple(x) for x in log['outputs'] ]
+		for step, ip in log['checkpoints']:
+			cp = snapshot.load(os.path.join(path, 'cp_%d.icvm' % step))
+			rec.checkpoints.append((step, ip, cp))
+		return rec
+
+class Recorder:
+
+	def __init__(self, vm, every=100000):
+		self.vm = vm
+		self.ip = vm.ip_state
+		self.steps = 0
+		self.recording = Recording(every)
+		self.recording.checkpoint(0, self.ip, vm)
+
+	def feed(self, values):
+		self.vm.feed(values)
+
+	def buffer_read(self, value):
+		self.vm.buffer_read(value)
+
+	def ascii_read(self, cmd):
+		self.vm.ascii_read(cmd)
+
+	def run_until(self):
+		vm = self.vm
+		rec = self.recording
+		vm.code = None # translations do not see writes made here
+		if vm.halted:
+			return []
+		first = len(rec.outputs)
+		while True:
+			left = rec.every - self.steps % rec.every
+			self.ip, done, status = execute(vm, self.ip, left, self.steps, rec.inputs, rec.outputs)
+			self.steps += done
+			if status == LIMIT:
+				rec.checkpoint(self.steps, self.ip, vm)
+			else:
+				return [ value for step, value in rec.outputs[first:] ]
+
+class Replay:
+
+	def __init__(self, recording):
+		self.recording = recording
+
+	def start(self, step):
+		# VM at the nearest checkpoint, with the inputs it will consume queued
+		cp_step, ip, cp = self.recording.nearest(step)
+		vm = cp.fork()
+		vm.prog_in = deque(value for s, value in self.recording.inputs if s >= cp_step)
+		return vm, ip, cp_step
+
+	def seek(self, step):
+		# The VM just before instruction number step runs; its ip_state is set so
+		# it can be inspected or resumed with run()
+		vm, ip, at = self.start(step)
+		inputs = []
+		outputs = []
+		ip, done, status = execute(vm, ip, step - at, at, inputs, outputs)
+		if at + done < step:
+			raise ValueError("Recording ends at step %d" % (at + done))
+		vm.ip_state = ip
+		vm.blocked = False
+		vm.code = None
+		return vm
+
+	def outputs(self, start=0, stop=None):
+		# Logged outputs made between two steps
+		return [ (s, v) for s, v in self.recording.outputs if s >= start and (stop is None or s < stop) ]
+
+	def verify(self):
+		# Rerun the whole log from the first checkpoint and check it reproduces
+		vm, ip, at = self.start(0)
+		inputs = []
+		outputs = []
+		status = LIMIT
+		while status == LIMIT:
+			ip, done, status = execute(vm, ip, self.recording.every, at, inputs, outputs)
+			at += done
+		if outputs != self.recording.outputs or inputs != self.recording.inputs:
+			for i, (got, want) in enumerate(zip(outputs, self.recording.outputs)):
+				if got != want:
+					raise ValueError("Replay diverges at output %d: %r instead of %r" % (i, got, want))
+			raise ValueError("Replay made %d outputs, recording has %d" % (len(outputs), len(self.recording.outputs)))
+		return [ value for step, value in outputs ]
@@ -0,0 +1,143 @@
+"""
+Save a paused IntPuterVM to a compact binary file and restore it later.
+
+	snapshot.save(vm, path)
+	vm = snapshot.load(path)
+
+The file holds the VM registers, pending input and memory as raw 64-bit cells,
+so load() maps it with mmap and copies the cells straight into memory without
+parsing or re-running anything.  Values that do not fit in 64 bits are stored
+separately as signed big-endian bytes and patched in afterwards.
+
+Cells are written in the machine's native byte order; snapshots are meant as a
+local warm-start cache, not an interchange format.
+"""
+
+import mmap
+import struct
+import sys
+from array import array
+
+from intcode.vm import IntPuterVM, BACKENDS
+from intcode.memory import PagedMemory, PAGE_BITS
+
+MAGIC = b'ICVM'
+VERSION = 1
+
+# magic, version, backend, flags, ip_state, base, segments, inputs, big values
+HEADER = struct.Struct('<4sBBHqqQQQ')
+SEGMENT = struct.Struct('<qq')
+BIG = struct.Struct('<QH')
+
+HALTED = 1
+BLOCKED = 2
+PAGED = 4
+TYPED = 8
+LAST_OUT = 16
+BIG_ENDIAN = 32
+
+INT64_MIN = -(1 << 63)
+INT64_MAX = (1 << 63) - 1
+
+def segments(mem):
+	# (start address, cells) runs covering the memory
+	if type(mem) is PagedMemory:
+		return [ (n << PAGE_BITS, mem.pages[n]) for n in sorted(mem.pages) ]
+	return [ (0, mem) ]
+
+def save(vm, path):
+	flags = 0
+	if vm.halted:
+		flags |= HALTED
+	if vm.blocked:
+		flags |= BLOCKED
+	if type(vm.mem) is PagedMemory:
+		flags |= PAGED
+		if vm.mem.typed:
+			flags |= TYPED
+	if vm.last_out is not None:
+		flags |= LAST_OUT
+	if sys.byteorder == 'big':
+		flags |= BIG_ENDIAN
+	segs = segments(vm.mem)
+	values = [ 0 if vm.last_out is None else vm.last_out ] + list(vm.prog_in)
+	for start, cells in segs:
+		values.extend(cells)
+	big = [ (i, v) for i, v in enumerate(values) if v < INT64_MIN or v > INT64_MAX ]
+	for i, v in big:
+		values[i] = 0
+	with open(path, 'wb') as outfile:
+		outfile.write(HEADER.pack(MAGIC, VERSION, BACKENDS.index(vm.backend), flags,
+			vm.ip_state, vm.base, len(segs), len(vm.prog_in), len(big)))
+		for start, cells in segs:
+			outfile.write(SEGMENT.pack(start, len(cells)))
+		outfile.write(array('q', values).tobytes())
+		for i, v in big:
+			raw = v.to_bytes((v.bit_length() + 8) // 8, 'big', signed=True)
+			outfile.write(BIG.pack(i, len(raw)))
+			outfile.write(raw)
+
+def load(path):
+	with open(path, 'rb') as infile:
+		mm = mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ)
+	try:
+		with memoryview(mm) as view:
+			return restore(view)
+	finally:
+		mm.close()
+
+def restore(view):
+	magic, version, backend, flags, ip_state, base, n_segs, n_inputs, n_big = HEADER.unpack_from(view, 0)
+	if magic != MAGIC or version != VERSION:
+		raise ValueError("Not an Intcode snapshot")
+	if bool(flags & BIG_ENDIAN) != (sys.byteorder == 'big'):
+		raise ValueError("Snapshot was written with a different byte order")
+	off = HEADER.size
+	segs = []
+	for i in range(n_segs):
+		segs.append(SEGMENT.unpack_from(view, off))
+		off += SEGMENT.size
+	n_values = 1 + n_inputs + sum(count for start, count in segs)
+	with view[off:off+8*n_values] as data, data.cast('q') as cells:
+		return build(backend, flags, ip_state, base, n_inputs, segs, data, cells, bigs(view, off+8*n_values, n_big))
+
+def bigs(view, pos, n_big):
+	big = dict()
+	for i in range(n_big):
+		idx, size = BIG.unpack_from(view, pos)
+		pos += BIG.size
+		big[idx] = int.from_bytes(view[pos:pos+size], 'big', signed=True)
+		pos += size
+	return big
+
+def build(backend, flags, ip_state, base, n_inputs, segs, data, cells, big):
+	def values(lo, hi):
+		vals = cells[lo:hi].tolist()
+		for idx in big:
+			if lo <= idx < hi:
+				vals[idx-lo] = big[idx]
+		return vals
+
+	vm = IntPuterVM([], BACKENDS[backend], paged=bool(flags & PAGED), typed=bool(flags & TYPED))
+	vm.halted = bool(flags & HALTED)
+	vm.blocked = bool(flags & BLOCKED)
+	vm.ip_state = ip_state
+	vm.base = base
+	vm.last_out = values(0, 1)[0] if flags & LAST_OUT else None
+	vm.prog_in.extend(values(1, 1+n_inputs))
+	idx = 1 + n_inputs
+	if flags & PAGED:
+		for start, count in segs:
+			n = start >> PAGE_BITS
+			if flags & TYPED and not any(idx <= i < idx+count for i in big):
+				page = array('q')
+				page.frombytes(data[8*idx:8*(idx+count)])
+			else:
+				page = values(idx, idx+count)
+			vm.mem.pages[n] = page
+			vm.mem.owned.add(n)
+			idx += count
+	else:
+		start, count = segs[0]
+		vm.mem = values(idx, idx+count)
+	return vm
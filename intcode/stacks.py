@@ -0,0 +1,225 @@
+"""
+Call stacks for the profiler: which Intcode subroutine the steps are spent in.
+
+	prof = vm.start_profile(stacks=True)
+	...run the VM...
+	vm.stop_profile()
+	prof.stacks.save("day13.folded")    # flamegraph.pl day13.folded > day13.svg
+	prof.stacks.functions()             # entry -> (self steps, total steps)
+
+The programs call a subroutine by storing the return address in [rb+0] and
+jumping to it with an immediate target; the subroutine moves the base with
+opcode 9, works above it, moves the base back and jumps through [rb+0].  So a
+taken jump with an immediate target at ip while [base] == ip+3 pushes a frame
+(entry, base, ip+3), and a jump that lands on the top frame's return address
+with its base restored pops it.  A jump that lands on a deeper frame's return
+address pops down to that frame, so a subroutine leaving its callees' frames
+behind does not wedge the stack.
+
+Every step is counted against the whole stack it ran under, and those counts
+are written out as folded stacks, one "main;fn_922;fn_922 1234" line per
+stack, which flamegraph.pl, speedscope and inferno all read.  Names default to
+fn_<entry address>; a dict of entry -> name can be given instead, e.g. from
+labels found with intcode.disasm.
+
+With stacks on, the profiled VM runs the loop in this module rather than the
+plain interpreter.  It still decodes through the profile's CountingCache, so
+the per-address counts of the flat profile stay exact.  The stack is part of
+the VM's state: it carries over when the VM blocks for input and resumes.
+"""
+
+from intcode.vm import decode
+
+class CallStacks:
+
+	def __init__(self):
+		self.stack = [] # (entry, caller's base, return address), innermost last
+		self.steps = dict() # tuple of entries -> steps spent with exactly that stack
+		self.calls = dict() # entry -> calls made to it
+
+	def run(self, vm):
+		return run(vm)
+
+	def run_until(self, vm, limit):
+		return execute(vm, limit)
+
+	def functions(self):
+		# entry -> (self steps, total steps including callees)
+		totals = dict()
+		for stack, n in self.steps.items():
+			if stack:
+				own, total = totals.get(stack[-1], (0, 0))
+				totals[stack[-1]] = (own + n, total)
+			for entry in set(stack):
+				own, total = totals.get(entry, (0, 0))
+				totals[entry] = (own, total + n)
+		return totals
+
+	def hot(self, n=10):
+		# Entries with the most self steps
+		return sorted(self.functions().items(), key=lambda item: -item[1][0])[:n]
+
+	def folded(self, names=None):
+		names = names or dict()
+		lines = []
+		for stack, n in sorted(self.steps.items()):
+			frames = ['main'] + [ names.get(entry, 'fn_%d' % entry) for entry in stack ]
+			lines.append('%s %d' % (';'.join(frames), n))
+		return '\n'.join(lines) + '\n'
+
+	def save(self, path, names=None):
+		with open(path, 'w') as outfile:
+			outfile.write(self.folded(names))
+
+def execute(vm, limit):
+	# The interpreter keeping track of calls; like IntPuterVM.interpret_until
+	calls = vm.profile.stacks
+	stack = calls.stack
+	steps = calls.steps
+	current = tuple(entry for entry, b, r in stack)
+	outs = []
+	mem = vm.mem
+	decoded = vm.decoded
+	prog_in = vm.prog_in
+	ip = vm.ip_state
+	base = vm.base
+	ops = dict() # instruction value -> decoded
+	n = 0 # steps under current since they were last added to steps
+	try:
+		while True:
+			if ip in decoded:
+				decoded[ip] # counted by the profile
+			else:
+				decoded[ip] = decode(mem[ip])
+			op = mem[ip]
+			if op not in ops:
+				ops[op] = decode(op)
+			opcode, m1, m2, m3 = ops[op]
+			n += 1
+			if opcode == 1 or opcode == 2 or opcode == 7 or opcode == 8:
+				C = mem[ip+1]
+				if m1 != 1:
+					if m1 == 2:
+						C += base
+					C = mem[C]
+				B = mem[ip+2]
+				if m2 != 1:
+					if m2 == 2:
+						B += base
+					B = mem[B]
+				A = mem[ip+3]
+				if m3 == 2:
+					A += base
+				elif m3 == 1:
+					A = ip+3
+				if opcode == 1:
+					R = C + B
+				elif opcode == 2:
+					R = C * B
+				elif opcode == 7:
+					R = 1 if C < B else 0
+				else:
+					R = 1 if C == B else 0
+				mem[A] = R
+				if A in decoded:
+					del decoded[A]
+				ip += 4
+			elif opcode == 5 or opcode == 6:
+				C = mem[ip+1]
+				if m1 != 1:
+					if m1 == 2:
+						C += base
+					C = mem[C]
+				if (C != 0) == (opcode == 5):
+					T = mem[ip+2]
+					if m2 != 1:
+						if m2 == 2:
+							T += base
+						T = mem[T]
+					if m2 == 1 and mem[base] == ip+3:
+						# A call
+						steps[current] = steps.get(current, 0) + n
+						n = 0
+						stack.append((T, base, ip+3))
+						current += (T,)
+						calls.calls[T] = calls.calls.get(T, 0) + 1
+					elif stack:
+						depth = len(stack)
+						while depth and stack[depth-1][1:] != (base, T):
+							depth -= 1
+						if depth:
+							# A return, to stack[depth-1]'s caller
+							steps[current] = steps.get(current, 0) + n
+							n = 0
+							del stack[depth-1:]
+							current = current[:depth-1]
+					ip = T
+				else:
+					ip += 3
+			elif opcode == 9:
+				C = mem[ip+1]
+				if m1 != 1:
+					if m1 == 2:
+						C += base
+					C = mem[C]
+				base += C
+				ip += 2
+			elif opcode == 3:
+				if len(prog_in) == 0:
+					vm.blocked = True
+					vm.ip_state = ip
+					vm.base = base
+					return outs
+				A = mem[ip+1]
+				if m1 == 2:
+					A += base
+				elif m1 == 1:
+					A = ip+1
+				mem[A] = prog_in.popleft()
+				if A in decoded:
+					del decoded[A]
+				ip += 2
+			elif opcode == 4:
+				C = mem[ip+1]
+				if m1 != 1:
+					if m1 == 2:
+						C += base
+					C = mem[C]
+				ip += 2
+				outs.append(C)
+				vm.last_out = C
+				if len(outs) == limit:
+					vm.ip_state = ip
+					vm.base = base
+					return outs
+			else: # Halt
+				vm.halted = True
+				vm.base = base
+				return outs
+	finally:
+		if n:
+			steps[current] = steps.get(current, 0) + n
+
+def run(vm):
+	# Generator form, keeping the interpreter's habit of storing its
+	# instruction pointer only when it blocks (see generate() in intcode/vm.py); the call
+	# stack is put back along with it
+	calls = vm.profile.stacks
+	start = vm.ip_state
+	start_stack = list(calls.stack)
+	ip = start
+	stack = start_stack
+	while True:
+		vm.ip_state = ip
+		calls.stack = list(stack)
+		outs = execute(vm, 1)
+		if not outs:
+			if vm.halted:
+				vm.ip_state = start
+				calls.stack = start_stack
+			return
+		ip = vm.ip_state
+		stack = calls.stack
+		vm.ip_state = start
+		calls.stack = list(start_stack)
+		yield outs[0]
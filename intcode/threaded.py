@@ -0,0 +1,173 @@
+"""
+Closure-threaded backend for IntPuterVM.
+
+Each compute instruction (opcodes 1, 2, 5, 6, 7, 8, 9) is turned into a small
+closure specialised for its opcode and parameter modes, with its operands
+captured as constants.  The main loop is then just ip = handlers[ip]() until it
+reaches an address that has no handler yet, an I/O instruction or a halt, which
+are dealt with one at a time like the interpreter does.
+
+Every cell covered by a built handler is remembered, so a write into code
+(opcode or operand) drops the handlers that read it.
+
+The compiled factories do not depend on the program, and are also kept on
+disk (intcode/codecache.py), so a later process loads them instead of
+compiling their source again.  VERSION is part of that cache's key; change it whenever
+the generated source changes.
+"""
+
+from intcode.vm import decode, generate, LENGTHS
+from intcode import codecache
+
+VERSION = 1
+
+# Source for one parameter read, by mode: position, immediate, relative
+READ = { 0 : 'mem[p%d]', 1 : 'p%d', 2 : 'mem[reg[0]+p%d]' }
+
+# Source for the write target, by mode
+WRITE = { 0 : 'p3', 1 : 'p3', 2 : 'reg[0]+p3' }
+
+EXPRS = {
+	1 : '%s + %s',
+	2 : '%s * %s',
+	7 : '1 if %s < %s else 0',
+	8 : '1 if %s == %s else 0',
+}
+
+# (opcode, modes) -> (code object, factory for the handler closure)
+factories = dict()
+
+def factory_source(opcode, m1, m2, m3):
+	src = "def make(mem, reg, code_cells, invalidate, p1, p2, p3, nxt):\n"
+	src += "\tdef op():\n"
+	if opcode in EXPRS:
+		src += "\t\td = %s\n" % WRITE[m3]
+		src += "\t\tmem[d] = %s\n" % (EXPRS[opcode] % (READ[m1] % 1, READ[m2] % 2))
+		src += "\t\tif d in code_cells:\n"
+		src += "\t\t\tinvalidate(d)\n"
+		src += "\t\treturn nxt\n"
+	elif opcode == 5:
+		src += "\t\treturn %s if %s != 0 else nxt\n" % (READ[m2] % 2, READ[m1] % 1)
+	elif opcode == 6:
+		src += "\t\treturn %s if %s == 0 else nxt\n" % (READ[m2] % 2, READ[m1] % 1)
+	elif opcode == 9:
+		src += "\t\treg[0] += %s\n" % (READ[m1] % 1)
+		src += "\t\treturn nxt\n"
+	src += "\treturn op\n"
+	return src
+
+def factory(opcode, m1, m2, m3, cache):
+	# Modes of parameters an opcode does not have are irrelevant
+	if opcode == 9:
+		m2 = m3 = 0
+	elif opcode == 5 or opcode == 6:
+		m3 = 0
+	key = (opcode, m1, m2, m3)
+	if key not in factories:
+		code = cache.get(key)
+		if code is None:
+			code = compile(factory_source(*key), "<intcode handler %d>" % opcode, 'exec')
+		factories[key] = (code, codecache.factory(code))
+	if cache.get(key) is None:
+		cache.put(key, factories[key][0])
+	return factories[key][1]
+
+class ThreadedCode:
+
+	def __init__(self, mem):
+		self.mem = mem
+		self.reg = [0]
+		self.handlers = dict()
+		self.decoded = dict()
+		self.code_cells = dict()
+		self.cache = codecache.lookup('closure', VERSION)
+
+	def cover(self, ip, length):
+		for addr in range(ip, ip+length):
+			if addr in self.code_cells:
+				self.code_cells[addr].append(ip)
+			else:
+				self.code_cells[addr] = [ip]
+
+	def invalidate(self, addr):
+		for ip in self.code_cells.pop(addr):
+			self.handlers.pop(ip, None)
+			self.decoded.pop(ip, None)
+
+	def decode(self, ip):
+		if ip not in self.decoded:
+			self.decoded[ip] = decode(self.mem[ip])
+			self.cover(ip, 1)
+		return self.decoded[ip]
+
+	def build(self, ip, opcode, m1, m2, m3):
+		mem = self.mem
+		length = LENGTHS[opcode]
+		p1 = mem[ip+1]
+		p2 = mem[ip+2] if length > 2 else None
+		p3 = mem[ip+3] if length > 3 else None
+		if m3 == 1: # immediate write target means the cell itself
+			p3 = ip+3
+		make = factory(opcode, m1, m2, m3, self.cache)
+		self.handlers[ip] = make(mem, self.reg, self.code_cells, self.invalidate, p1, p2, p3, ip+length)
+		self.cover(ip, length)
+
+def run(vm):
+	return generate(vm, run_until)
+
+def run_until(vm, limit):
+	outs = []
+	if vm.code is None:
+		vm.code = ThreadedCode(vm.mem)
+	code = vm.code
+	mem = vm.mem
+	reg = code.reg
+	get = code.handlers.get
+	code_cells = code.code_cells
+	prog_in = vm.prog_in
+	ip = vm.ip_state
+	reg[0] = vm.base
+	while True:
+		h = get(ip)
+		while h is not None:
+			ip = h()
+			h = get(ip)
+		opcode, m1, m2, m3 = code.decode(ip)
+		if opcode == 3: # Store input at param 1
+			if len(prog_in) == 0:
+				vm.blocked = True
+				vm.ip_state = ip
+				vm.base = reg[0]
+				if outs:
+					vm.last_out = outs[-1]
+				return outs
+			A = mem[ip+1]
+			if m1 == 2:
+				A += reg[0]
+			elif m1 == 1:
+				A = ip+1
+			mem[A] = prog_in.popleft()
+			if A in code_cells:
+				code.invalidate(A)
+			ip += 2
+		elif opcode == 4: # Output value at param 1
+			C = mem[ip+1]
+			if m1 == 0:
+				C = mem[C]
+			elif m1 == 2:
+				C = mem[reg[0]+C]
+			ip += 2
+			outs.append(C)
+			if len(outs) == limit:
+				vm.last_out = C
+				vm.ip_state = ip
+				vm.base = reg[0]
+				return outs
+		elif opcode == 99: # Halt
+			vm.halted = True
+			vm.base = reg[0]
+			if outs:
+				vm.last_out = outs[-1]
+			return outs
+		else:
+			code.build(ip, opcode, m1, m2, m3)
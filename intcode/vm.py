@@ -0,0 +1,292 @@
+"""
+Shared Intcode computer used by the Intcode days (07, 09, 11, 13, 15, 17, 19, 21, 23, 25).
+
+IntPuterVM(memory, backend) picks how run() executes the program:
+
+	'interp'   - decode-and-dispatch interpreter (this module)
+	'closure'  - closure-threaded code (intcode/threaded.py)
+	'compiled' - basic blocks compiled to Python (intcode/compiler.py)
+
+With paged=True memory is an intcode.memory.PagedMemory instead of the
+program list padded with 5000 zeros, so any address can be used and each VM
+only holds the pages it has written.  typed=True also stores those pages as
+array('q'), promoting a page to Python ints if a value outgrows 64 bits.
+
+Input is queued in a deque.  Besides the run() generator, feed() queues many
+inputs at once and run_until() executes until the VM blocks, halts or has
+produced max_outputs values, returning the outputs as one list.  Each backend
+has just that one loop; run() is generate() asking it for one output at a
+time.
+
+arun(inbox, outbox) is a coroutine running the VM against asyncio queues
+(intcode/aio.py), so networks of VMs can be wired up as tasks.
+
+start_profile() switches on execution counting (intcode/profile.py) until
+stop_profile(); an unprofiled VM runs exactly the same loops as before.  With
+stacks=True it also counts steps per reconstructed call stack
+(intcode/stacks.py).
+watch() sets read/write watchpoints (intcode/watch.py) the same way, running
+an instrumented copy of the interpreter until unwatch().  memoize() likewise
+runs a copy that caches the effects of pure subroutine calls by the values
+they read (intcode/memo.py), until unmemoize().
+
+Instructions are decoded once per address into (opcode, mode1, mode2, mode3)
+and kept in a cache.  A write that lands on a cached address drops that entry,
+so self-modifying programs still see their new instructions.
+"""
+
+from collections import deque
+
+from intcode.memory import PagedMemory
+from intcode.profile import Profile, CountingCache
+
+# Instruction length (including the opcode cell) for every opcode
+LENGTHS = { 1 : 4, 2 : 4, 3 : 2, 4 : 2, 5 : 3, 6 : 3, 7 : 4, 8 : 4, 9 : 2, 99 : 1 }
+
+def decode(op):
+	opcode = op % 100
+	if opcode not in LENGTHS:
+		raise ValueError("Unknown opcode %d" % op)
+	return opcode, op // 100 % 10, op // 1000 % 10, op // 10000 % 10
+
+BACKENDS = ('interp', 'closure', 'compiled')
+
+class IntPuterVM:
+
+	def __init__(self, memory, backend='interp', paged=False, typed=False):
+		if backend not in BACKENDS:
+			raise ValueError("Unknown backend %s" % backend)
+		if paged or typed:
+			self.mem = PagedMemory(memory, typed)
+		else:
+			self.mem = memory
+			self.mem += [0] * 5000
+		self.last_out = None
+		self.prog_in = deque()
+		self.halted = False
+		self.blocked = True
+		self.ip_state = 0
+		self.base = 0
+		self.decoded = dict()
+		self.backend = backend
+		self.code = None # backend specific translation, built on first run
+		self.digest = None # hash of the image, for the on-disk code cache
+		self.profile = None
+		self.watcher = None
+		self.memo = None
+
+	def __deepcopy__(self, memo):
+		return self.fork()
+
+	def fork(self):
+		# Independent VM in the same state.  Paged memory is shared copy-on-write,
+		# list memory is copied; the remaining state is small and immutable
+		# values, so shallow copies of the containers are enough.
+		vm = type(self).__new__(type(self))
+		vm.__dict__.update(self.__dict__)
+		vm.mem = self.mem.copy()
+		vm.prog_in = deque(self.prog_in)
+		vm.decoded = self.decoded.copy()
+		vm.code = None # translations hold on to the old memory
+		vm.profile = None
+		vm.watcher = None
+		vm.memo = None
+		return vm
+
+	def buffer_read(self, i):
+		self.prog_in.append(i)
+		self.blocked = False
+
+	def feed(self, values):
+		self.prog_in.extend(values)
+		if self.prog_in:
+			self.blocked = False
+
+	def ascii_read(self, cmd):
+		for char in cmd:
+			self.buffer_read(ord(char))
+		self.buffer_read(10)
+
+	def start_profile(self, stacks=False):
+		self.profile = Profile()
+		if stacks:
+			self.profile.stacks = CallStacks()
+		self.decoded = CountingCache(self.decoded, self.mem, self.profile.hits)
+		return self.profile
+
+	def stop_profile(self):
+		self.decoded = dict(self.decoded)
+		self.profile = None
+
+	def watch(self, lo, hi=None, kind='rw', callback=None):
+		if self.watcher is None:
+			self.watcher = Watcher()
+		self.watcher.add(lo, hi, kind, callback)
+		return self.watcher
+
+	def unwatch(self):
+		self.watcher = None
+
+	def memoize(self):
+		if self.memo is None:
+			self.memo = Memo()
+		return self.memo
+
+	def unmemoize(self):
+		self.memo = None
+
+	def run(self):
+		if self.watcher is not None:
+			return watch.run(self)
+		elif self.memo is not None:
+			return memo.run(self)
+		elif self.profile is not None:
+			return profile.run(self)
+		elif self.backend == 'closure':
+			return threaded.run(self)
+		elif self.backend == 'compiled':
+			return compiler.run(self)
+		return self.interpret()
+
+	def arun(self, inbox, outbox, poll=None, idle=None):
+		return aio.run(self, inbox, outbox, poll, idle)
+
+	def run_until(self, max_outputs=None):
+		limit = -1 if max_outputs is None else max_outputs
+		if limit == 0:
+			return []
+		if self.watcher is not None:
+			return watch.run_until(self, limit)
+		elif self.memo is not None:
+			return memo.run_until(self, limit)
+		elif self.profile is not None:
+			return profile.run_until(self, limit)
+		elif self.backend == 'closure':
+			return threaded.run_until(self, limit)
+		elif self.backend == 'compiled':
+			return compiler.run_until(self, limit)
+		return self.interpret_until(limit)
+
+	def interpret(self):
+		return generate(self, IntPuterVM.interpret_until)
+
+	def interpret_until(self, limit):
+		outs = []
+		mem = self.mem
+		decoded = self.decoded
+		prog_in = self.prog_in
+		ip = self.ip_state
+		base = self.base
+		while True:
+			if ip in decoded:
+				opcode, m1, m2, m3 = decoded[ip]
+			else:
+				opcode, m1, m2, m3 = decoded[ip] = decode(mem[ip])
+			if opcode == 1 or opcode == 2 or opcode == 7 or opcode == 8:
+				C = mem[ip+1]
+				if m1 == 0:
+					C = mem[C]
+				elif m1 == 2:
+					C = mem[base+C]
+				B = mem[ip+2]
+				if m2 == 0:
+					B = mem[B]
+				elif m2 == 2:
+					B = mem[base+B]
+				A = mem[ip+3]
+				if m3 == 2:
+					A += base
+				elif m3 == 1:
+					A = ip+3
+				if opcode == 1: # res = C + B
+					mem[A] = C + B
+				elif opcode == 2: # res = C * B
+					mem[A] = C * B
+				elif opcode == 7: # res = C < B
+					mem[A] = 1 if C < B else 0
+				else: # res = C == B
+					mem[A] = 1 if C == B else 0
+				if A in decoded:
+					del decoded[A]
+				ip += 4
+			elif opcode == 5 or opcode == 6: # Jump if True (non-zero) / False (zero)
+				C = mem[ip+1]
+				if m1 == 0:
+					C = mem[C]
+				elif m1 == 2:
+					C = mem[base+C]
+				if (C != 0) == (opcode == 5):
+					ip = mem[ip+2]
+					if m2 == 0:
+						ip = mem[ip]
+					elif m2 == 2:
+						ip = mem[base+ip]
+				else:
+					ip += 3
+			elif opcode == 9: # adjust base pointer by param
+				C = mem[ip+1]
+				if m1 == 0:
+					C = mem[C]
+				elif m1 == 2:
+					C = mem[base+C]
+				base += C
+				ip += 2
+			elif opcode == 3: # Store input at param 1
+				if len(prog_in) == 0:
+					self.blocked = True
+					self.ip_state = ip
+					self.base = base
+					if outs:
+						self.last_out = outs[-1]
+					return outs
+				A = mem[ip+1]
+				if m1 == 2:
+					A += base
+				elif m1 == 1:
+					A = ip+1
+				mem[A] = prog_in.popleft()
+				if A in decoded:
+					del decoded[A]
+				ip += 2
+			elif opcode == 4: # Output value at param 1
+				C = mem[ip+1]
+				if m1 == 0:
+					C = mem[C]
+				elif m1 == 2:
+					C = mem[base+C]
+				ip += 2
+				outs.append(C)
+				if len(outs) == limit:
+					self.last_out = C
+					self.ip_state = ip
+					self.base = base
+					return outs
+			else: # Halt
+				self.halted = True
+				self.base = base
+				if outs:
+					self.last_out = outs[-1]
+				return outs
+
+def generate(vm, until):
+	# Generator form of a run_until loop, until(vm, limit), one output at a
+	# time.  The loops only store their instruction pointer when they block, so
+	# a run abandoned at an output, or ended by a halt, resumes from where this
+	# one started; keep that behaviour here.
+	start = vm.ip_state
+	ip = start
+	while True:
+		vm.ip_state = ip
+		outs = until(vm, 1)
+		if not outs:
+			if vm.halted:
+				vm.ip_state = start
+			return
+		ip = vm.ip_state
+		vm.ip_state = start
+		yield outs[0]
+
+from intcode import threaded, compiler, profile, aio, watch, memo
+from intcode.stacks import CallStacks
+from intcode.watch import Watcher
+from intcode.memo import Memo
@@ -0,0 +1,106 @@
+"""
+Pool of reusable VMs for many short runs of one program.
+
+	pool = VMPool(prog)
+	outs = pool.run((x, y))
+
+The program can also be a paused IntPuterVM, whose memory, registers and
+pending input are then what every run starts from.
+
+With paged=True every VM in the pool uses paged memory forked from one
+pristine image, so it shares the image's pages until it writes to them (see
+intcode/memory.py).  The pages a run wrote are exactly the ones it owns
+afterwards; putting the VM back swaps those for the pristine pages again (or
+drops them, if the image never had them).  A reset costs O(pages written).
+
+Plain list memory runs faster, but a list cannot tell which cells were
+written, so by default a VM keeps its one list and a reset copies the image
+back over it in place: a single memcpy-speed slice assignment, still with
+no new VM, memory list or padding per run.  Either way the registers and
+input queue are reset too.
+
+The pool also keeps a decode cache valid for the pristine image, built from
+the entries the runs decoded on cells they had not changed, and each VM
+starts from a copy of it, so a probe does not decode the program again.
+"""
+
+from intcode.vm import IntPuterVM
+from intcode.memory import PagedMemory
+from intcode import codecache
+
+class VMPool:
+
+	def __init__(self, program, size=1, backend='interp', paged=False, typed=False):
+		if isinstance(program, IntPuterVM):
+			mem = program.mem
+			image = [ mem[addr] for addr in range(len(mem)) ]
+			self.start = (program.ip_state, program.base, tuple(program.prog_in))
+		else:
+			image = list(program)
+			self.start = (0, 0, ())
+		self.pristine = IntPuterVM(image, backend, paged=paged or typed, typed=typed)
+		if backend == 'compiled':
+			codecache.digest(self.pristine) # once, for every VM forked from it
+		self.decoded = dict() # address -> decoded entry valid for the image
+		self.free = [ self.build() for i in range(size) ]
+		self.runs = 0
+
+	def build(self):
+		vm = self.pristine.fork()
+		if type(vm.mem) is PagedMemory:
+			vm.mem.owned = set() # nothing is written yet, every page is the image's
+		self.reset(vm)
+		return vm
+
+	def acquire(self):
+		if self.free:
+			return self.free.pop()
+		return self.build()
+
+	def learn(self, vm):
+		# Keep vm's decode entries for cells that still hold the image's value
+		image = self.pristine.mem
+		mem = vm.mem
+		for ip in vm.decoded.keys() - self.decoded.keys():
+			if mem[ip] == image[ip]:
+				self.decoded[ip] = vm.decoded[ip]
+
+	def reset(self, vm):
+		mem = vm.mem
+		if type(mem) is PagedMemory:
+			image = self.pristine.mem.pages
+			for n in mem.owned:
+				if n in image:
+					mem.pages[n] = image[n]
+				else:
+					del mem.pages[n]
+			mem.owned.clear()
+		else:
+			mem[:] = self.pristine.mem
+		vm.ip_state, vm.base, prog_in = self.start
+		vm.last_out = None
+		vm.prog_in.clear()
+		vm.prog_in.extend(prog_in)
+		vm.halted = False
+		vm.blocked = not prog_in
+		vm.decoded = self.decoded.copy()
+		vm.code = None
+		vm.profile = None
+		vm.watcher = None
+		vm.memo = None
+
+	def release(self, vm):
+		self.learn(vm)
+		self.reset(vm)
+		self.free.append(vm)
+
+	def run(self, inputs):
+		# Outputs of one run from the start with these inputs, until it blocks or
+		# halts
+		vm = self.acquire()
+		try:
+			vm.feed(inputs)
+			return vm.run_until()
+		finally:
+			self.release(vm)
+			self.runs += 1
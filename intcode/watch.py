@@ -0,0 +1,186 @@
+"""
+Memory watchpoints and access tracing for IntPuterVM.
+
+	watcher = vm.watch(380, 400, kind='w', callback=on_write)
+	...run the VM...
+	watcher.counts      # (addr, kind) -> accesses
+	watcher.trace       # last accesses as (step, ip, kind, addr, value)
+	vm.unwatch()
+
+While a watcher is set, run() and run_until() go through the loop in this
+module instead of the VM's own, whatever the backend.  It is the plain
+interpreter with a set lookup on every data read and write, so watched
+addresses cost a callback and a trace entry and all others one membership
+test; a VM without a watcher runs exactly the loops it always did.
+
+Reads are operand fetches through position or relative mode; instruction
+fetches and immediates are not accesses.  kind 'r' is a read, 'w' a write.
+Each event is (step, ip, kind, addr, value), where step counts instructions
+since the watcher was made.  The trace is a ring buffer holding the most
+recent events; callbacks get every event as it happens.
+"""
+
+from collections import deque
+
+from intcode.vm import decode, generate
+
+class Watcher:
+
+	def __init__(self, trace=1024):
+		self.reads = dict() # address -> callbacks (possibly empty) for reads
+		self.writes = dict() # address -> callbacks for writes
+		self.trace = deque(maxlen=trace)
+		self.counts = dict() # (addr, kind) -> number of accesses
+		self.steps = 0
+
+	def add(self, lo, hi=None, kind='rw', callback=None):
+		# Watch lo..hi inclusive (just lo if hi is None)
+		hi = lo if hi is None else hi
+		for table, k in ((self.reads, 'r'), (self.writes, 'w')):
+			if k in kind:
+				for addr in range(lo, hi+1):
+					callbacks = table.setdefault(addr, [])
+					if callback is not None:
+						callbacks.append(callback)
+
+	def hit(self, step, ip, kind, addr, value, callbacks):
+		event = (self.steps + step, ip, kind, addr, value)
+		self.trace.append(event)
+		key = (addr, kind)
+		self.counts[key] = self.counts.get(key, 0) + 1
+		for callback in callbacks:
+			callback(event)
+
+	def hot(self, n=10):
+		# Most accessed (addr, kind) pairs
+		return sorted(self.counts.items(), key=lambda item: -item[1])[:n]
+
+def execute(vm, limit):
+	# The interpreter with watchpoints; like IntPuterVM.interpret_until
+	w = vm.watcher
+	reads = w.reads
+	writes = w.writes
+	outs = []
+	mem = vm.mem
+	decoded = vm.decoded
+	prog_in = vm.prog_in
+	ip = vm.ip_state
+	base = vm.base
+	ops = dict() # instruction value -> decoded
+	step = 0
+	try:
+		while True:
+			op = mem[ip]
+			if op not in ops:
+				ops[op] = decode(op)
+			opcode, m1, m2, m3 = ops[op]
+			if opcode == 1 or opcode == 2 or opcode == 7 or opcode == 8:
+				C = mem[ip+1]
+				if m1 != 1:
+					if m1 == 2:
+						C += base
+					if C in reads:
+						w.hit(step, ip, 'r', C, mem[C], reads[C])
+					C = mem[C]
+				B = mem[ip+2]
+				if m2 != 1:
+					if m2 == 2:
+						B += base
+					if B in reads:
+						w.hit(step, ip, 'r', B, mem[B], reads[B])
+					B = mem[B]
+				A = mem[ip+3]
+				if m3 == 2:
+					A += base
+				elif m3 == 1:
+					A = ip+3
+				if opcode == 1:
+					R = C + B
+				elif opcode == 2:
+					R = C * B
+				elif opcode == 7:
+					R = 1 if C < B else 0
+				else:
+					R = 1 if C == B else 0
+				mem[A] = R
+				if A in decoded:
+					del decoded[A]
+				if A in writes:
+					w.hit(step, ip, 'w', A, R, writes[A])
+				ip += 4
+			elif opcode == 5 or opcode == 6:
+				C = mem[ip+1]
+				if m1 != 1:
+					if m1 == 2:
+						C += base
+					if C in reads:
+						w.hit(step, ip, 'r', C, mem[C], reads[C])
+					C = mem[C]
+				if (C != 0) == (opcode == 5):
+					T = mem[ip+2]
+					if m2 != 1:
+						if m2 == 2:
+							T += base
+						if T in reads:
+							w.hit(step, ip, 'r', T, mem[T], reads[T])
+						T = mem[T]
+					ip = T
+				else:
+					ip += 3
+			elif opcode == 9:
+				C = mem[ip+1]
+				if m1 != 1:
+					if m1 == 2:
+						C += base
+					if C in reads:
+						w.hit(step, ip, 'r', C, mem[C], reads[C])
+					C = mem[C]
+				base += C
+				ip += 2
+			elif opcode == 3:
+				if len(prog_in) == 0:
+					vm.blocked = True
+					vm.ip_state = ip
+					vm.base = base
+					return outs
+				A = mem[ip+1]
+				if m1 == 2:
+					A += base
+				elif m1 == 1:
+					A = ip+1
+				R = prog_in.popleft()
+				mem[A] = R
+				if A in decoded:
+					del decoded[A]
+				if A in writes:
+					w.hit(step, ip, 'w', A, R, writes[A])
+				ip += 2
+			elif opcode == 4:
+				C = mem[ip+1]
+				if m1 != 1:
+					if m1 == 2:
+						C += base
+					if C in reads:
+						w.hit(step, ip, 'r', C, mem[C], reads[C])
+					C = mem[C]
+				ip += 2
+				outs.append(C)
+				vm.last_out = C
+				if len(outs) == limit:
+					vm.ip_state = ip
+					vm.base = base
+					step += 1
+					return outs
+			else: # Halt
+				vm.halted = True
+				vm.base = base
+				return outs
+			step += 1
+	finally:
+		w.steps += step
+
+def run(vm):
+	return generate(vm, execute)
+
+def run_until(vm, limit):
+	return execute(vm, limit)